@@ -0,0 +1,59 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import wraps
+from threading import Lock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+
+READ_METHODS = ('GET', 'HEAD')
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_VIEW_WORKERS,
+                thread_name_prefix='async-view',
+            )
+    return _executor
+
+
+def _run_in_thread(view, request, *args, **kwargs):
+    try:
+        return view(request, *args, **kwargs)
+    finally:
+        connection.close()
+
+
+def async_read_view(view):
+    """Асинхронная обёртка над представлением DRF для чтения.
+
+    Под ASGI Django 3.2 выполняет все синхронные представления процесса
+    в одном потоке, по очереди. GET-запросы обёрнутого представления
+    выполняются в пуле из ASYNC_VIEW_WORKERS потоков, по одному потоку
+    и одному соединению с БД на запрос; флаги пользователя загружаются
+    параллельно (см. foodgram.user_flags.PrefetchUserFlagsMixin).
+    Остальные методы, как и все запросы под WSGI, выполняются так же,
+    как без обёртки.
+    """
+    sync_view = sync_to_async(view, thread_sensitive=True)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if (request.method not in READ_METHODS
+                or not isinstance(request, ASGIRequest)):
+            return await sync_view(request, *args, **kwargs)
+        return await asyncio.wrap_future(get_executor().submit(
+            copy_context().run, _run_in_thread, view, request,
+            *args, **kwargs
+        ))
+
+    return async_view
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('foodgram.requests')
+
+_counters = ContextVar('query_counters', default=())
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.lock = Lock()
+
+    def record(self, duration):
+        with self.lock:
+            self.count += 1
+            self.duration += duration
+
+
+def count_query(execute, sql, params, many, context):
+    """Передаёт запрос всем активным счётчикам.
+
+    Счётчики берутся из контекстной переменной, поэтому учитываются
+    и запросы из потоков, в которых асинхронные представления выполняют
+    синхронный код.
+    """
+    counters = _counters.get()
+    if not counters:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = perf_counter() - started
+        for counter in counters:
+            counter.record(duration)
+
+
+def install_query_counter(sender=None, connection=None, **kwargs):
+    # В начало списка: execute_wrapper() снимает обёртку с конца.
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_query)
+
+
+@contextmanager
+def count_queries(counter):
+    """Считает запросы к БД, выполненные внутри блока, в counter."""
+    for connection in connections.all():
+        install_query_counter(connection=connection)
+    token = _counters.set(_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _counters.reset(token)
+
+
+connection_created.connect(install_query_counter)
+
+
+def get_view_name(request, view_func):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    method = request.method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class QueryBudgetMiddleware:
+    """Считает запросы к БД и время ответа для каждого запроса.
+
+    Время рендеринга ответа DRF (см. foodgram.renderers) считается
+    отдельно от времени приложения. Результат отдаётся в заголовке
+    Server-Timing и пишется в лог foodgram.requests одной JSON-строкой; запросы, превысившие бюджет
+    из QUERY_BUDGETS, пишутся с уровнем WARNING.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        counter, started = self.start(request)
+        with count_queries(counter):
+            response = self.get_response(request)
+        return self.finish(request, response, counter, started)
+
+    async def __acall__(self, request):
+        counter, started = self.start(request)
+        with count_queries(counter):
+            response = await self.get_response(request)
+        return self.finish(request, response, counter, started)
+
+    def start(self, request):
+        request.view_name = None
+        request.render_duration = 0.0
+        return QueryCounter(), perf_counter()
+
+    def finish(self, request, response, counter, started):
+        total = perf_counter() - started
+
+        db_ms = counter.duration * 1000
+        render_ms = request.render_duration * 1000
+        total_ms = total * 1000
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={db_ms:.1f};desc="{counter.count} queries"',
+            f'render;dur={render_ms:.1f}',
+            f'app;dur={total_ms - db_ms - render_ms:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ))
+        if request.view_name is None:
+            return response
+
+        budget = settings.QUERY_BUDGETS.get(request.view_name)
+        over_budget = budget is not None and counter.count > budget
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            json.dumps({
+                'view': request.view_name,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': counter.count,
+                'db_ms': round(db_ms, 2),
+                'render_ms': round(render_ms, 2),
+                'total_ms': round(total_ms, 2),
+                'budget': budget,
+                'over_budget': over_budget,
+            })
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_name = get_view_name(request, view_func)
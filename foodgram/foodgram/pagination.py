@@ -1,5 +1,108 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class LimitPageNumberPaginator(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class KeysetPaginator(LimitPageNumberPaginator):
+    """Пагинация по ключу сортировки вместо OFFSET и COUNT(*).
+
+    Включается параметром ?cursor= (пустое значение — первая страница),
+    без него ведёт себя как LimitPageNumberPaginator, если не задан
+    keyset_by_default. Порядок берётся из атрибута keyset_ordering
+    представления; если он равен None (ключ сортировки меняется между
+    запросами), страницы всегда выбираются по номеру.
+    """
+    cursor_query_param = 'cursor'
+    keyset_by_default = False
+    invalid_cursor_message = 'Неверный курсор.'
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'keyset_ordering', self.ordering)
+        self.keyset = ordering is not None and (
+            self.keyset_by_default
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.ordering = ordering
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.decode_cursor(request, queryset)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_keyset_filter(cursor))
+        page = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = [
+                getattr(page[-1], field.lstrip('-'))
+                for field in self.ordering
+            ]
+        return page
+
+    def get_keyset_filter(self, cursor):
+        keyset_filter = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition = Q(**{f'{name}__{lookup}': cursor[index]})
+            for previous, value in zip(self.ordering[:index], cursor):
+                condition &= Q(**{previous.lstrip('-'): value})
+            keyset_filter |= condition
+        return keyset_filter
+
+    @staticmethod
+    def get_field(queryset, name):
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(name)
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                self.get_field(queryset, field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        encoded = urlsafe_b64encode(
+            json.dumps(position, default=str).encode()
+        ).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            encoded
+        )
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        next_link = None
+        if self.next_position is not None:
+            next_link = self.encode_cursor(self.next_position)
+        return Response(OrderedDict([
+            ('next', next_link),
+            ('results', data),
+        ]))
@@ -0,0 +1,27 @@
+from time import perf_counter
+
+from rest_framework.renderers import JSONRenderer
+
+
+class TimingRendererMixin:
+    """Добавляет время рендеринга ответа к запросу.
+
+    QueryBudgetMiddleware отдаёт его в Server-Timing и пишет в лог
+    отдельно от времени представления.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            request = (renderer_context or {}).get('request')
+            if request is not None:
+                request = request._request
+                request.render_duration = getattr(
+                    request, 'render_duration', 0.0
+                ) + perf_counter() - started
+
+
+class TimingJSONRenderer(TimingRendererMixin, JSONRenderer):
+    pass
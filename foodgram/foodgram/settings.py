@@ -66,6 +66,7 @@ DJOSER = {
 }
 
 MIDDLEWARE = [
+    'foodgram.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -95,6 +96,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
+ASGI_APPLICATION = 'foodgram.asgi.application'
 
 
 # Database
@@ -111,6 +113,66 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.getenv('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+
+USER_FLAGS_CACHE_TIMEOUT = 60 * 60
+USER_FLAGS_WORKERS = 4
+
+
+# Logging
+# https://docs.djangoproject.com/en/3.2/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {
+            'format': '%(message)s',
+        },
+    },
+    'handlers': {
+        'requests': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'foodgram.requests': {
+            'handlers': ['requests'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+QUERY_BUDGETS = {
+    'RecipeViewSet.list': 8,
+    'RecipeViewSet.retrieve': 8,
+    'RecipeViewSet.what_to_cook': 8,
+    'RecipeViewSet.shopping_cart_totals': 2,
+    'RecipeViewSet.feed': 8,
+    'RecipeViewSet.similar': 6,
+    'RecipeViewSet.create': 16,
+    'RecipeViewSet.update': 20,
+    'RecipeViewSet.partial_update': 20,
+    'FollowListApiView.get': 6,
+    'IngredientViewSet.list': 2,
+    'TagViewSet.list': 2,
+    'DownloadShop.get': 3,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -154,6 +216,43 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+
+IMAGE_PROCESSING_ASYNC = True
+IMAGE_PROCESSING_WORKERS = 2
+
+FEED_FANOUT_ASYNC = True
+FEED_FANOUT_WORKERS = 2
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+FEED_BACKFILL = 20
+
+SIMILAR_RECIPES_TOP_K = 10
+
+INDEX_REBUILD_ASYNC = True
+
+ASYNC_VIEW_WORKERS = 8
+
+TRENDING_HALF_LIFE = 3 * 24 * 60 * 60
+# 2021-01-01 00:00 UTC
+TRENDING_REFERENCE_TIME = 1609459200
+TRENDING_RESCALE_EXPONENT = 512
+TRENDING_MIN_SCORE = 0.01
+TRENDING_WEIGHTS = {
+    'favorite': 1.0,
+    'shopping_cart': 0.5,
+}
+
+INGREDIENT_SEARCH_LIMIT = 20
+INGREDIENT_AUTOCOMPLETE_CACHE = True
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+
+RECIPE_SEARCH_CONFIG = 'russian'
+
+PDF_FONT_PATH = os.getenv(
+    'PDF_FONT_PATH',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -164,6 +263,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'foodgram.renderers.TimingJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
@@ -0,0 +1,147 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+from threading import Lock
+from time import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from recipes.models import FavoriteRecipe, Shop
+from users.models import Follow
+
+FAVORITE = 'favorite'
+SHOPPING_CART = 'shopping_cart'
+FOLLOW = 'follow'
+
+VERSION_KEY = 'user-flags-version:{}:{}'
+KEY = 'user-flags:{}:{}:{}'
+SOURCES = {
+    FAVORITE: (FavoriteRecipe, 'recipe_id'),
+    SHOPPING_CART: (Shop, 'recipe_id'),
+    FOLLOW: (Follow, 'following_id'),
+}
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_flag_versions(user_id, kinds):
+    keys = {kind: VERSION_KEY.format(kind, user_id) for kind in kinds}
+    cached = cache.get_many(keys.values())
+    versions = {}
+    for kind, key in keys.items():
+        version = cached.get(key)
+        if version is None:
+            version = time()
+            if not cache.add(key, version, settings.USER_FLAGS_CACHE_TIMEOUT):
+                version = cache.get(key, version)
+        versions[kind] = version
+    return versions
+
+
+def load_user_flags(user_id, kinds):
+    """Множества флагов kinds: из кэша одним запросом, недостающие — из БД.
+
+    Ключ множества содержит версию, которую меняет invalidate_user_flags.
+    Множество, прочитанное из БД до изменения, запишется под старой
+    версией, и его уже никто не прочитает.
+    """
+    keys = {
+        kind: KEY.format(kind, user_id, version)
+        for kind, version in get_flag_versions(user_id, kinds).items()
+    }
+    cached = cache.get_many(keys.values())
+    flags = {}
+    missing = {}
+    for kind, key in keys.items():
+        if key in cached:
+            flags[kind] = cached[key]
+            continue
+        model, field = SOURCES[kind]
+        flags[kind] = missing[key] = frozenset(model.objects.filter(
+            user_id=user_id
+        ).values_list(field, flat=True))
+    if missing:
+        cache.set_many(missing, settings.USER_FLAGS_CACHE_TIMEOUT)
+    return flags
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.USER_FLAGS_WORKERS,
+                thread_name_prefix='user-flags',
+            )
+    return _executor
+
+
+def _load_in_thread(user_id, kinds):
+    try:
+        return load_user_flags(user_id, kinds)
+    finally:
+        connection.close()
+
+
+def _request_flags(request):
+    return getattr(request, '_request', request).__dict__.setdefault(
+        '_user_flags', {}
+    )
+
+
+def prefetch_user_flags(request, kinds):
+    """Начинает загрузку флагов, пока представление выбирает объекты.
+
+    Все виды флагов загружаются одной задачей пула, так что запрос
+    занимает не больше одного потока пула и одного соединения с БД.
+    Внутри транзакции флаги не загружаются заранее: другое соединение
+    не увидело бы её изменений.
+    """
+    if request.user.is_anonymous or connection.in_atomic_block:
+        return
+    flags = _request_flags(request)
+    kinds = [kind for kind in kinds if kind not in flags]
+    if not kinds:
+        return
+    future = get_executor().submit(
+        copy_context().run, _load_in_thread, request.user.id, kinds
+    )
+    for kind in kinds:
+        flags[kind] = future
+
+
+def get_user_flags(request, kind):
+    """Множество id рецептов (или авторов), отмеченных пользователем.
+
+    Множество берётся из общего кэша и запоминается на объекте запроса,
+    так что за один запрос кэш читается не больше одного раза. Если
+    загрузка начата prefetch_user_flags, ждёт её результата.
+    """
+    if request is None or request.user.is_anonymous:
+        return frozenset()
+    flags = _request_flags(request)
+    if kind not in flags:
+        flags[kind] = load_user_flags(request.user.id, (kind,))[kind]
+    elif isinstance(flags[kind], Future):
+        flags[kind] = flags[kind].result()[kind]
+    return flags[kind]
+
+
+class PrefetchUserFlagsMixin:
+    """Для GET-запросов загружает флаги user_flags параллельно
+    с выборкой объектов представлением."""
+    user_flags = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method == 'GET' and self.user_flags:
+            prefetch_user_flags(request, self.user_flags)
+
+
+def invalidate_user_flags(user_id, kind):
+    transaction.on_commit(lambda: cache.set(
+        VERSION_KEY.format(kind, user_id), time(),
+        settings.USER_FLAGS_CACHE_TIMEOUT
+    ))
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from django.db.models import Count
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
 
 from .models import (
     Ingredient,
@@ -9,6 +11,12 @@ from .models import (
     Shop,
     Tag,
 )
+from .services import (
+    apply_shopping_list_deltas, get_cart_users, get_recipe_amounts,
+    lock_recipe
+)
+
+User = get_user_model()
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -41,15 +49,41 @@ class RecipeAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
     def favorite_count(self, obj):
-        return obj.obj_count
+        return obj.favorites_count
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            User.objects.filter(pk=obj.author_id).update(
+                recipes_count=F('recipes_count') + 1
+            )
 
-    def get_queryset(self, request):
-        queryset = super().get_queryset(request)
-        return queryset.annotate(
-            obj_count=Count(
-                'recipe_favorite', distinct=True
+    def save_related(self, request, form, formsets, change):
+        # Итоги списков покупок меняются так же, как при правке через API:
+        # на разницу состава до и после сохранения строк ингредиентов.
+        recipe = form.instance
+        lock_recipe(recipe.pk)
+        before = get_recipe_amounts(recipe.pk)
+        super().save_related(request, form, formsets, change)
+        deltas = get_recipe_amounts(recipe.pk)
+        for ingredient_id, amount in before.items():
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) - amount
+        apply_shopping_list_deltas(get_cart_users(recipe.pk), deltas)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            lock_recipe(obj.pk)
+            apply_shopping_list_deltas(
+                get_cart_users(obj.pk), get_recipe_amounts(obj.pk, sign=-1)
             )
-        )
+            obj.delete()
+            User.objects.filter(
+                pk=obj.author_id, recipes_count__gt=0
+            ).update(recipes_count=F('recipes_count') - 1)
+
+    def delete_queryset(self, request, queryset):
+        for recipe in queryset:
+            self.delete_model(request, recipe)
 
 
 class FavoriteRecipeAdmin(admin.ModelAdmin):
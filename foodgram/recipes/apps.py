@@ -1,6 +1,28 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from .cache import bump_reference_version
+        from .models import Ingredient, IngredientAmount, Recipe, Tag
+        from .search import (
+            bump_search_version, ingredient_amount_changed,
+            ingredient_changed, recipe_changed
+        )
+        from .signals import create_indexes
+        post_migrate.connect(create_indexes, sender=self)
+        post_save.connect(bump_search_version, sender=Recipe)
+        post_delete.connect(bump_search_version, sender=Recipe)
+        post_save.connect(recipe_changed, sender=Recipe)
+        post_save.connect(ingredient_amount_changed, sender=IngredientAmount)
+        post_delete.connect(
+            ingredient_amount_changed, sender=IngredientAmount
+        )
+        post_save.connect(ingredient_changed, sender=Ingredient)
+        for model in (Ingredient, Tag):
+            post_save.connect(bump_reference_version, sender=model)
+            post_delete.connect(bump_reference_version, sender=model)
@@ -0,0 +1,56 @@
+from bisect import bisect_left
+from threading import Lock
+
+from .cache import get_reference_version
+from .models import Ingredient
+
+
+class IngredientIndex:
+    """Отсортированный по названию массив ингредиентов в памяти процесса.
+
+    Совпадения по началу названия ищутся бинарным поиском, остальные
+    вхождения подстроки добавляются после них.
+    """
+
+    def __init__(self, rows):
+        self.items = sorted(
+            (name.lower(), pk, name, unit) for pk, name, unit in rows
+        )
+        self.keys = [item[0] for item in self.items]
+
+    def search(self, query, limit):
+        query = query.lower()
+        results = []
+        position = bisect_left(self.keys, query)
+        while (position < len(self.keys) and len(results) < limit
+               and self.keys[position].startswith(query)):
+            results.append(self.items[position])
+            position += 1
+        if len(results) < limit:
+            for item in self.items:
+                key = item[0]
+                if query in key and not key.startswith(query):
+                    results.append(item)
+                    if len(results) == limit:
+                        break
+        return [
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for _, pk, name, unit in results
+        ]
+
+
+_index = None
+_version = None
+_lock = Lock()
+
+
+def get_ingredient_index():
+    global _index, _version
+    version = get_reference_version(Ingredient._meta.model_name)
+    with _lock:
+        if _index is None or _version != version:
+            _index = IngredientIndex(Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ))
+            _version = version
+        return _index
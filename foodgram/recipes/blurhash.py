@@ -0,0 +1,82 @@
+from math import cos, pi
+
+BASE83 = (
+    '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    'abcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+)
+
+
+def _base83(value, length):
+    return ''.join(
+        BASE83[value // 83 ** (length - position - 1) % 83]
+        for position in range(length)
+    )
+
+
+def _srgb_to_linear(value):
+    value = value / 255
+    if value <= 0.04045:
+        return value / 12.92
+    return ((value + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value, exponent):
+    return abs(value) ** exponent * (1 if value >= 0 else -1)
+
+
+def encode(image, x_components=4, y_components=3):
+    """Кодирует уменьшенное RGB-изображение Pillow в строку BlurHash."""
+    width, height = image.size
+    pixels = [
+        tuple(_srgb_to_linear(channel) for channel in pixel)
+        for pixel in image.getdata()
+    ]
+    factors = []
+    for j in range(y_components):
+        cos_y = [cos(pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            cos_x = [cos(pi * i * x / width) for x in range(width)]
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[x] * cos_y[y]
+                    pixel = pixels[row + x]
+                    r += basis * pixel[0]
+                    g += basis * pixel[1]
+                    b += basis * pixel[2]
+            scale = (1 if i == j == 0 else 2) / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        actual_max = max(abs(value) for factor in ac for value in factor)
+        quantised_max = int(max(0, min(82, int(actual_max * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+    else:
+        quantised_max = 0
+        max_value = 1
+    result += _base83(quantised_max, 1)
+    result += _base83(
+        (_linear_to_srgb(dc[0]) << 16)
+        + (_linear_to_srgb(dc[1]) << 8)
+        + _linear_to_srgb(dc[2]),
+        4
+    )
+    for factor in ac:
+        r, g, b = (
+            int(max(0, min(18, int(
+                _sign_pow(value / max_value, 0.5) * 9 + 9.5
+            ))))
+            for value in factor
+        )
+        result += _base83(r * 19 * 19 + g * 19 + b, 2)
+    return result
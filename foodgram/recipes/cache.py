@@ -0,0 +1,67 @@
+from hashlib import md5
+from time import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+VERSION_KEY = 'reference-version:{}'
+RESPONSE_KEY = 'reference-response:{}:{}:{}'
+
+
+def get_reference_version(namespace):
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        version = time()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_reference_version(sender, **kwargs):
+    cache.set(VERSION_KEY.format(sender._meta.model_name), time(), None)
+
+
+class ReferenceCacheMixin:
+    """Кэширует ответы list/retrieve справочных вьюсетов.
+
+    Ключ кэша и ETag содержат версию справочника, которая меняется при
+    каждом изменении модели, поэтому устаревшие записи не читаются.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, view, request, *args, **kwargs):
+        namespace = self.queryset.model._meta.model_name
+        version = get_reference_version(namespace)
+        path = md5(request.get_full_path().encode()).hexdigest()
+        etag = quote_etag(f'{namespace}-{version:.6f}-{path}')
+        last_modified = int(version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            return response
+
+        key = RESPONSE_KEY.format(namespace, version, path)
+        data = cache.get(key)
+        if data is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cache.set(key, response.data, settings.REFERENCE_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Accept',))
+        return response
@@ -0,0 +1,55 @@
+from array import array
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+
+from .indexes import VersionedIndex
+from .models import IngredientAmount, Recipe
+from .services import CHUNK_SIZE
+
+
+class CoverageIndex:
+    """Списки рецептов по ингредиентам в памяти процесса.
+
+    Для каждого ингредиента хранится отсортированный массив id рецептов,
+    в которые он входит, для каждого рецепта — число его ингредиентов.
+    """
+
+    def __init__(self, rows):
+        self.postings = {}
+        self.sizes = Counter()
+        for ingredient_id, group in groupby(rows, key=itemgetter(0)):
+            recipes = array('l', (recipe_id for _, recipe_id in group))
+            self.postings[ingredient_id] = recipes
+            self.sizes.update(recipes)
+
+    def search(self, ingredient_ids, min_coverage=0.0):
+        """Рецепты с долей имеющихся ингредиентов не ниже min_coverage.
+
+        Возвращает список (recipe_id, coverage, missing), отсортированный
+        по убыванию доли, затем по числу недостающих ингредиентов.
+        """
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(self.postings.get(ingredient_id, ()))
+        results = []
+        for recipe_id, count in matched.items():
+            size = self.sizes[recipe_id]
+            coverage = count / size
+            if coverage >= min_coverage:
+                results.append((recipe_id, coverage, size - count))
+        results.sort(key=lambda item: (-item[1], item[2], -item[0]))
+        return results
+
+
+_index = VersionedIndex(Recipe._meta.model_name, lambda: CoverageIndex(
+    IngredientAmount.objects.order_by(
+        'ingredient_id', 'recipe_id'
+    ).values_list('ingredient_id', 'recipe_id').iterator(
+        chunk_size=CHUNK_SIZE
+    )
+))
+
+
+def get_coverage_index():
+    return _index.get()
@@ -0,0 +1,125 @@
+import csv
+import os
+from tempfile import TemporaryFile
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FALLBACK_FONT = 'Helvetica'
+PDF_FONT_SIZE = 12
+PDF_HEADER_FONT_SIZE = 14
+PDF_MARGIN = 50
+PDF_LINE_HEIGHT = 18
+PDF_MAX_LINES = 2000
+PDF_TRUNCATED = 'Список обрезан, полностью он доступен в форматах txt и csv.'
+FILE_BLOCK_SIZE = 64 * 1024
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def _format_row(row):
+    return (
+        row['ingredient__name'],
+        row['total'],
+        row['ingredient__measurement_unit'],
+    )
+
+
+def export_txt(header, rows):
+    yield f'{header}\n\n'
+    for row in rows:
+        name, total, unit = _format_row(row)
+        yield f'{name}: {total} {unit}\n'
+
+
+def export_csv(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for row in rows:
+        yield writer.writerow(_format_row(row))
+
+
+def _get_pdf_font():
+    if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT_NAME
+    if not os.path.exists(settings.PDF_FONT_PATH):
+        return PDF_FALLBACK_FONT
+    pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, settings.PDF_FONT_PATH))
+    return PDF_FONT_NAME
+
+
+def export_pdf(header, rows):
+    """Строки читаются из курсора по мере рисования страниц, а готовый
+    документ отдаётся блоками из временного файла на диске.
+
+    Canvas reportlab держит все страницы в памяти до save(), и первый
+    байт отправляется только после этого, поэтому документ ограничен
+    PDF_MAX_LINES строками; остальные строки не читаются.
+    """
+    font = _get_pdf_font()
+    width, height = A4
+    text_width = width - 2 * PDF_MARGIN
+    with TemporaryFile() as buffer:
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        y = height - PDF_MARGIN
+
+        def draw(line, size):
+            nonlocal y
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                y = height - PDF_MARGIN
+            pdf.setFont(font, size)
+            pdf.drawString(PDF_MARGIN, y, line)
+            y -= PDF_LINE_HEIGHT
+
+        for line in simpleSplit(header, font, PDF_HEADER_FONT_SIZE,
+                                text_width):
+            draw(line, PDF_HEADER_FONT_SIZE)
+        y -= PDF_LINE_HEIGHT
+        lines = 0
+        for row in rows:
+            if lines >= PDF_MAX_LINES:
+                draw(PDF_TRUNCATED, PDF_FONT_SIZE)
+                break
+            name, total, unit = _format_row(row)
+            for line in simpleSplit(f'{name}: {total} {unit}', font,
+                                    PDF_FONT_SIZE, text_width):
+                draw(line, PDF_FONT_SIZE)
+                lines += 1
+        pdf.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(FILE_BLOCK_SIZE), b'')
+
+
+def spool(chunks):
+    """Записывает выгрузку во временный файл и возвращает его с начала.
+
+    Для ответов, которые нельзя отдавать генератором: память остаётся
+    ограниченной, а файл удаляется при закрытии.
+    """
+    buffer = TemporaryFile()
+    try:
+        for chunk in chunks:
+            buffer.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        buffer.seek(0)
+    except BaseException:
+        buffer.close()
+        raise
+    return buffer
+
+
+EXPORTERS = {
+    'txt': (export_txt, 'text/plain; charset=utf-8', 'shopping-list.txt'),
+    'csv': (export_csv, 'text/csv; charset=utf-8', 'shopping-list.csv'),
+    'pdf': (export_pdf, 'application/pdf', 'shopping-list.pdf'),
+}
@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+
+from foodgram.pagination import KeysetPaginator
+from users.models import Follow
+from .models import FeedEntry, Recipe
+from .services import CHUNK_SIZE, get_latest_recipes
+
+FEED_ORDERING = ('-pub_date', '-recipe_id')
+
+_executor = None
+_executor_lock = Lock()
+
+
+class FeedPaginator(KeysetPaginator):
+    keyset_by_default = True
+    ordering = FEED_ORDERING
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.FEED_FANOUT_WORKERS,
+                thread_name_prefix='feed-fanout',
+            )
+    return _executor
+
+
+def schedule_feed_fanout(recipe_id):
+    if settings.FEED_FANOUT_ASYNC:
+        get_executor().submit(_fan_out_in_thread, recipe_id)
+    else:
+        fan_out_recipe(recipe_id)
+
+
+def _fan_out_in_thread(recipe_id):
+    try:
+        fan_out_recipe(recipe_id)
+    finally:
+        connection.close()
+
+
+def add_entries(rows, user_ids):
+    """Добавляет рецепты rows (id, author_id, pub_date) в ленты user_ids."""
+    batch = []
+    for user_id in user_ids:
+        for recipe_id, author_id, pub_date in rows:
+            batch.append(FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            ))
+            if len(batch) == CHUNK_SIZE:
+                FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_recipe(recipe_id):
+    """Записывает новый рецепт в ленты подписчиков автора.
+
+    Рецепты авторов с числом подписчиков больше FEED_FANOUT_MAX_FOLLOWERS
+    не раскладываются по лентам: подписчики забирают их сами при чтении.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).values_list(
+        'id', 'author_id', 'pub_date', 'author__followers_count'
+    ).first()
+    if recipe is None:
+        return
+    *row, followers_count = recipe
+    if followers_count > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        return
+    add_entries([row], Follow.objects.filter(
+        following_id=row[1]
+    ).values_list('user_id', flat=True).iterator(chunk_size=CHUNK_SIZE))
+
+
+def backfill_feed(user_id, author_ids):
+    """Добавляет в ленту последние рецепты авторов, на которых подписались."""
+    recipes = get_latest_recipes(author_ids, settings.FEED_BACKFILL)
+    add_entries(
+        list(recipes.values_list('id', 'author_id', 'pub_date')), [user_id]
+    )
+
+
+def pull_popular_authors(user_id):
+    """Забирает в ленту новые рецепты авторов без раскладки по лентам."""
+    authors = list(Follow.objects.filter(
+        user_id=user_id,
+        following__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).values_list('following_id', flat=True))
+    if not authors:
+        return
+    newest = FeedEntry.objects.filter(
+        user_id=user_id, author_id__in=authors
+    ).aggregate(newest=Max('pub_date'))['newest']
+    if newest is None:
+        backfill_feed(user_id, authors)
+        return
+    add_entries(
+        list(Recipe.objects.filter(
+            author_id__in=authors, pub_date__gt=newest
+        ).values_list('id', 'author_id', 'pub_date')),
+        [user_id]
+    )
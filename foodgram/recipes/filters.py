@@ -1,6 +1,16 @@
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
 from django_filters import rest_framework as filters
 
-from .models import Ingredient, Recipe, Tag
+from .models import FavoriteRecipe, Ingredient, Recipe, Shop, Tag
+from .search import search_recipes
+
+SEARCH_ORDERING = ('-search_rank', '-pub_date', '-id')
+ORDERINGS = {
+    'trending': ('-trending_score', '-id'),
+    'popular': ('-favorites_count', '-id'),
+}
+TAGS_ANY = 'any'
+TAGS_ALL = 'all'
 
 
 class RecipeFilter(filters.FilterSet):
@@ -8,30 +18,88 @@ class RecipeFilter(filters.FilterSet):
         field_name='tags__slug',
         queryset=Tag.objects.all(),
         to_field_name='slug',
+        method='filter_tags',
+    )
+    tags_mode = filters.ChoiceFilter(
+        choices=((TAGS_ANY, 'Любой из тэгов'), (TAGS_ALL, 'Все тэги')),
+        method='filter_tags_mode',
     )
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('trending', 'Популярные сейчас'),
+            ('popular', 'Популярные за всё время'),
+        ),
+        method='filter_ordering',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'tags', 'tags_mode', 'author', 'is_favorited',
+            'is_in_shopping_cart', 'search', 'ordering'
+        )
 
-    def filter_is_favorited(self, queryset, name, value):
-        if value:
-            return queryset.filter(in_favorite__user=self.request.user)
+    def filter_tags(self, queryset, name, value):
+        """Фильтрует через EXISTS, поэтому рецепты не дублируются."""
+        if not value:
+            return queryset
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk')
+        )
+        if self.form.cleaned_data.get('tags_mode') == TAGS_ALL:
+            for tag in value:
+                queryset = queryset.filter(
+                    Exists(recipe_tags.filter(tag_id=tag.id))
+                )
+            return queryset
+        return queryset.filter(Exists(
+            recipe_tags.filter(tag_id__in=[tag.id for tag in value])
+        ))
+
+    def filter_tags_mode(self, queryset, name, value):
         return queryset
 
+    def filter_marked(self, queryset, model, value):
+        """Рецепты, отмеченные пользователем: EXISTS по таблице отметок."""
+        if not value:
+            return queryset
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none()
+        return queryset.filter(Exists(
+            model.objects.filter(user_id=user.id, recipe_id=OuterRef('pk'))
+        ))
+
+    def filter_is_favorited(self, queryset, name, value):
+        return self.filter_marked(queryset, FavoriteRecipe, value)
+
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        if value:
-            return queryset.filter(shopping_recipe__user=self.request.user)
-        return queryset
+        return self.filter_marked(queryset, Shop, value)
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value).order_by(*SEARCH_ORDERING)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*ORDERINGS[value])
 
 
 class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(field_name='name', lookup_expr='icontains')
+    name = filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name', )
+
+    def filter_name(self, queryset, name, value):
+        return queryset.filter(name__icontains=value).annotate(
+            is_prefix=Case(
+                When(name__istartswith=value, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('is_prefix', 'name')
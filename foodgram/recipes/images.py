@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .blurhash import encode
+from .models import Recipe
+
+RENDITION_WIDTHS = {
+    'thumbnail': 320,
+    'medium': 800,
+}
+RENDITION_FORMATS = {
+    'webp': 'WEBP',
+    'jpg': 'JPEG',
+}
+RENDITION_QUALITY = 80
+BLURHASH_SIZE = (32, 32)
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+    return _executor
+
+
+def schedule_image_processing(recipe_id):
+    if settings.IMAGE_PROCESSING_ASYNC:
+        get_executor().submit(_process_in_thread, recipe_id)
+    else:
+        process_recipe_image(recipe_id)
+
+
+def _process_in_thread(recipe_id):
+    try:
+        process_recipe_image(recipe_id)
+    finally:
+        connection.close()
+
+
+def reset_image_renditions(recipe):
+    """Сбрасывает копии картинки, если она заменена.
+
+    Пока новые копии строятся, клиенты получают пустые image_renditions
+    и image_blurhash, а не копии старой картинки. Старые файлы
+    удаляются после коммита.
+    """
+    stale = list(recipe.image_renditions.values())
+    recipe.image_renditions = {}
+    recipe.image_blurhash = ''
+    transaction.on_commit(lambda: delete_files(stale))
+
+
+def delete_files(paths):
+    for path in paths:
+        default_storage.delete(path)
+
+
+def process_recipe_image(recipe_id):
+    """Строит уменьшенные копии картинки рецепта и её BlurHash."""
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'id', 'image', 'image_renditions'
+    ).first()
+    if recipe is None or not recipe.image:
+        return
+    with recipe.image.open('rb') as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    renditions = {}
+    for name, width in RENDITION_WIDTHS.items():
+        rendition = image.copy()
+        rendition.thumbnail((width, width * 4), Image.LANCZOS)
+        for extension, image_format in RENDITION_FORMATS.items():
+            buffer = BytesIO()
+            rendition.save(buffer, image_format, quality=RENDITION_QUALITY)
+            renditions[f'{name}_{extension}'] = default_storage.save(
+                f'recipes/renditions/{recipe.pk}/{name}.{extension}',
+                ContentFile(buffer.getvalue())
+            )
+    blurhash = encode(image.resize(BLURHASH_SIZE))
+
+    updated = Recipe.objects.filter(
+        pk=recipe.pk, image=recipe.image.name
+    ).update(image_renditions=renditions, image_blurhash=blurhash)
+    delete_files(
+        recipe.image_renditions.values() if updated else renditions.values()
+    )
@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.db import connection
+
+from .cache import get_reference_version
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix='recipe-indexes',
+            )
+    return _executor
+
+
+class VersionedIndex:
+    """Индекс в памяти процесса, который следует версии справочника.
+
+    В первый раз индекс строится в запросе. Когда версия меняется,
+    запросы продолжают читать прежний индекс, а новый строится в фоне
+    и подменяет его целиком; одновременно идёт не больше одной
+    перестройки индекса.
+    """
+
+    def __init__(self, namespace, build):
+        self.namespace = namespace
+        self.build = build
+        self.index = None
+        self.version = None
+        self.rebuilding = False
+        self.lock = Lock()
+
+    def get(self):
+        version = get_reference_version(self.namespace)
+        with self.lock:
+            if self.index is None:
+                self.index = self.build()
+                self.version = version
+            if self.version == version or self.rebuilding:
+                return self.index
+            if not settings.INDEX_REBUILD_ASYNC:
+                self.index = self.build()
+                self.version = version
+                return self.index
+            self.rebuilding = True
+        get_executor().submit(self._rebuild_in_thread, version)
+        return self.index
+
+    def _rebuild_in_thread(self, version):
+        try:
+            index = self.build()
+            with self.lock:
+                self.index = index
+                self.version = version
+        finally:
+            with self.lock:
+                self.rebuilding = False
+            connection.close()
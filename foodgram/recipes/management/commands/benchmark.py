@@ -0,0 +1,180 @@
+import json
+import tracemalloc
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from foodgram.middleware import QueryCounter, count_queries
+from recipes.models import Recipe, Tag
+from .request_report import percentile
+from .seed_benchmark_data import get_benchmark_users
+
+SCENARIOS = (
+    ('recipes_list', '/api/recipes/?limit=6'),
+    ('recipes_list_cursor', '/api/recipes/?limit=6&cursor='),
+    ('recipes_filtered', '/api/recipes/?limit=6&tags={tag}&is_favorited=1'),
+    ('recipes_trending', '/api/recipes/?limit=6&ordering=trending'),
+    ('recipes_search', '/api/recipes/?limit=6&search=рецепт'),
+    ('recipe_retrieve', '/api/recipes/{recipe}/'),
+    ('recipe_similar', '/api/recipes/{recipe}/similar/'),
+    ('subscriptions', '/api/users/subscriptions/?recipes_limit=3'),
+    ('feed', '/api/recipes/feed/?limit=6'),
+    ('ingredient_search', '/api/ingredients/?name=сах'),
+    ('download_shopping_cart', '/api/recipes/download_shopping_cart/'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the key API endpoints through the test client and report '
+        'latency, query counts and allocations.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--user',
+            help='Email пользователя, от имени которого идут запросы.'
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=[name for name, _ in SCENARIOS],
+            help='Запустить только указанные сценарии.'
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кэш перед каждым запросом.'
+        )
+        parser.add_argument(
+            '--output',
+            help='Сохранить результаты в json-файл.'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='json-файл с прошлыми результатами для сравнения.'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=1.2,
+            help='Допустимый рост p50 относительно --baseline.'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должен быть больше нуля')
+        users = get_benchmark_users()
+        if options['user']:
+            users = users.model.objects.filter(email=options['user'])
+        user = users.order_by('id').first()
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        tag = Tag.objects.order_by('id').first()
+        if user is None or recipe is None or tag is None:
+            raise CommandError(
+                'Нет данных для теста, запустите seed_benchmark_data'
+            )
+
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user)
+        self.cold = options['cold']
+        results = {}
+        for name, url in SCENARIOS:
+            if options['scenario'] and name not in options['scenario']:
+                continue
+            url = url.format(recipe=recipe.id, tag=tag.slug)
+            for _ in range(options['warmup']):
+                self.request(client, url)
+            runs = [
+                self.request(client, url)
+                for _ in range(options['iterations'])
+            ]
+            results[name] = {
+                'url': url,
+                'status': runs[-1]['status'],
+                'p50_ms': percentile([run['ms'] for run in runs], 50),
+                'p95_ms': percentile([run['ms'] for run in runs], 95),
+                'queries': max(run['queries'] for run in runs),
+                'peak_kib': self.request(client, url, trace=True)['peak_kib'],
+            }
+        self.report(results)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='UTF-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['threshold'])
+
+    def request(self, client, url, trace=False):
+        """Выполняет запрос в транзакции, которая затем откатывается.
+
+        Так запросы с побочными эффектами (выгрузка списка покупок
+        очищает корзину) не меняют данные между итерациями.
+        """
+        if self.cold:
+            cache.clear()
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            stack.enter_context(transaction.atomic())
+            stack.enter_context(count_queries(counter))
+            if trace:
+                tracemalloc.start()
+            started = perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            elapsed = perf_counter() - started
+            peak = 0
+            if trace:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            transaction.set_rollback(True)
+        return {
+            'status': response.status_code,
+            'ms': elapsed * 1000,
+            'queries': counter.count,
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"scenario":<26}{"status":>7}{"p50 ms":>9}{"p95 ms":>9}'
+            f'{"queries":>9}{"peak KiB":>10}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<26}{result["status"]:>7}{result["p50_ms"]:>9.1f}'
+                f'{result["p95_ms"]:>9.1f}{result["queries"]:>9}'
+                f'{result["peak_kib"]:>10.1f}'
+            )
+
+    def compare(self, results, path, threshold):
+        with open(path, encoding='UTF-8') as file:
+            baseline = json.load(file)
+        regressions = []
+        for name, result in results.items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            if result['queries'] > previous['queries']:
+                regressions.append(
+                    f'{name}: запросов {previous["queries"]} → '
+                    f'{result["queries"]}'
+                )
+            if result['p50_ms'] > previous['p50_ms'] * threshold:
+                regressions.append(
+                    f'{name}: p50 {previous["p50_ms"]:.1f} → '
+                    f'{result["p50_ms"]:.1f} мс'
+                )
+        if regressions:
+            raise CommandError(
+                'Обнаружены регрессии:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,130 @@
+import csv
+import json
+import os
+import re
+from itertools import islice
+from time import monotonic
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.cache import bump_reference_version
+from recipes.models import Ingredient, Tag
+
+DATA_DIR = os.path.join(settings.BASE_DIR, 'recipes', 'data')
+READ_SIZE = 64 * 1024
+SEPARATORS = re.compile(r'[\s,]*')
+
+DATASETS = {
+    'ingredients': {
+        'model': Ingredient,
+        'fields': ('name', 'measurement_unit'),
+        'path': os.path.join(DATA_DIR, 'ingredients.csv'),
+    },
+    'tags': {
+        'model': Tag,
+        'fields': ('name', 'color', 'slug'),
+        'path': os.path.join(DATA_DIR, 'recipes_tag.csv'),
+    },
+}
+
+
+def read_csv(file, fields):
+    for row in csv.reader(file):
+        if len(row) == len(fields):
+            yield dict(zip(fields, row))
+
+
+def read_json(file, fields):
+    """Разбирает JSON-массив объектов по частям, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while not buffer:
+        chunk = file.read(READ_SIZE)
+        if not chunk:
+            break
+        buffer = chunk.lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('JSON-файл должен содержать массив объектов')
+    index = 1
+    while True:
+        index = SEPARATORS.match(buffer, index).end()
+        if buffer.startswith(']', index):
+            return
+        try:
+            item, index = decoder.raw_decode(buffer, index)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError('Неожиданный конец JSON-файла')
+            # Разобранное начало буфера отбрасывается раз на чтение,
+            # а не после каждого объекта.
+            buffer = buffer[index:] + chunk
+            index = 0
+            continue
+        if isinstance(item, dict) and all(field in item for field in fields):
+            yield {field: item[field] for field in fields}
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+class Command(BaseCommand):
+    help = 'Load ingredients or tags from csv- or json-file to DB.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=DATASETS.keys())
+        parser.add_argument(
+            '--path',
+            help='Путь к csv- или json-файлу с данными.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном INSERT.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Прочитать файл без записи в базу.'
+        )
+
+    def handle(self, *args, **options):
+        dataset = DATASETS[options['dataset']]
+        model = dataset['model']
+        fields = dataset['fields']
+        path = options['path'] or dataset['path']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError(f'Неподдерживаемый формат файла: {path}')
+
+        before = model.objects.count()
+        total = 0
+        started = monotonic()
+        with open(path, 'r', encoding='UTF-8') as file:
+            rows = reader(file, fields)
+            while True:
+                batch = [model(**row) for row in islice(rows, batch_size)]
+                if not batch:
+                    break
+                if not options['dry_run']:
+                    model.objects.bulk_create(batch, ignore_conflicts=True)
+                total += len(batch)
+        elapsed = max(monotonic() - started, 1e-6)
+        if not options['dry_run']:
+            bump_reference_version(model)
+
+        created = model.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'{model._meta.verbose_name_plural}: прочитано {total}, '
+            f'добавлено {created} за {elapsed:.2f} с '
+            f'({total / elapsed:.0f} строк/с)'
+            + (' [dry-run]' if options['dry_run'] else '')
+        ))
@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoriteRecipe, Recipe
+from recipes.search import update_search_documents
+from recipes.services import rebuild_shopping_lists
+from users.models import Follow
+
+User = get_user_model()
+
+
+def count_subquery(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total')
+        ),
+        Value(0)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalculate denormalized favorite, recipe and follower counters, '
+        'recipe search documents and shopping list totals.'
+    )
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            recipes = Recipe.objects.update(
+                favorites_count=count_subquery(
+                    FavoriteRecipe.objects.all(), 'recipe'
+                )
+            )
+            users = User.objects.update(
+                recipes_count=count_subquery(Recipe.objects.all(), 'author'),
+                followers_count=count_subquery(
+                    Follow.objects.all(), 'following'
+                ),
+            )
+            documents = update_search_documents(Recipe.objects.all())
+            shopping_items = rebuild_shopping_lists()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}, '
+            f'поисковых документов: {documents}, '
+            f'строк в списках покупок: {shopping_items}'
+        ))
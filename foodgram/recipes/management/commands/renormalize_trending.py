@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes.trending import renormalize_trending
+
+
+class Command(BaseCommand):
+    help = 'Rescale recipe trending scores to the current epoch.'
+
+    def handle(self, *args, **kwargs):
+        updated = renormalize_trending()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {updated}'
+        ))
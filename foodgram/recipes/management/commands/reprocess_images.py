@@ -0,0 +1,36 @@
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Build image renditions and BlurHash for recipes missing them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перестроить копии картинок всех рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_blurhash='')
+        started = monotonic()
+        processed = failed = 0
+        for recipe_id in recipes.values_list('id', flat=True).iterator():
+            try:
+                process_recipe_image(recipe_id)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe_id}: {error}')
+                continue
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {processed}, с ошибками: {failed} '
+            f'за {monotonic() - started:.2f} с'
+        ))
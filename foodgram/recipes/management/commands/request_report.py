@@ -0,0 +1,61 @@
+import json
+import sys
+from collections import defaultdict
+from math import ceil
+
+from django.core.management.base import BaseCommand
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = 'Aggregate foodgram.requests log lines into a per-view report.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='*',
+            help='Файлы с логом; без аргументов лог читается из stdin.'
+        )
+
+    def read_records(self, paths):
+        files = [open(path, encoding='UTF-8') for path in paths] or [
+            sys.stdin
+        ]
+        for file in files:
+            with file:
+                for line in file:
+                    try:
+                        record = json.loads(line[line.find('{'):])
+                    except ValueError:
+                        continue
+                    if isinstance(record, dict) and 'view' in record:
+                        yield record
+
+    def handle(self, *args, **options):
+        views = defaultdict(list)
+        for record in self.read_records(options['paths']):
+            views[record['view']].append(record)
+
+        self.stdout.write(
+            f'{"view":<40}{"count":>7}{"p50 ms":>9}{"p95 ms":>9}'
+            f'{"p95 render":>11}'
+            f'{"p50 q":>7}{"p95 q":>7}{"max q":>7}{"over":>6}'
+        )
+        for view, records in sorted(
+                views.items(), key=lambda item: -len(item[1])):
+            total_ms = [record['total_ms'] for record in records]
+            render_ms = [record.get('render_ms', 0) for record in records]
+            queries = [record['queries'] for record in records]
+            over = sum(1 for record in records if record.get('over_budget'))
+            self.stdout.write(
+                f'{view:<40}{len(records):>7}'
+                f'{percentile(total_ms, 50):>9.1f}'
+                f'{percentile(total_ms, 95):>9.1f}'
+                f'{percentile(render_ms, 95):>11.1f}'
+                f'{percentile(queries, 50):>7}{percentile(queries, 95):>7}'
+                f'{max(queries):>7}{over:>6}'
+            )
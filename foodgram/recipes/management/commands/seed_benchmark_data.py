@@ -0,0 +1,227 @@
+import random
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from recipes.cache import bump_reference_version
+from recipes.feed import backfill_feed
+from recipes.models import (
+    FavoriteRecipe, Ingredient, IngredientAmount, Recipe, Shop, Tag
+)
+from users.models import Follow
+
+User = get_user_model()
+
+EMAIL_DOMAIN = 'benchmark.local'
+PASSWORD = 'benchmark'
+IMAGE_PATH = 'media/benchmark.jpg'
+TAG_PREFIX = 'bench-'
+INGREDIENTS_PER_RECIPE = (3, 12)
+BATCH_SIZE = 1000
+
+
+def get_benchmark_users():
+    return User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, recipes and relations for benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=10,
+            help='Количество рецептов на одного пользователя.'
+        )
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=10,
+            help='Количество подписок на одного пользователя.'
+        )
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=20,
+            help='Количество избранных рецептов на одного пользователя.'
+        )
+        parser.add_argument(
+            '--cart',
+            type=int,
+            default=5,
+            help='Количество рецептов в списке покупок пользователя.'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Зерно генератора, одинаковое зерно даёт одинаковые данные.'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить ранее созданные тестовые данные.'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users должен быть больше нуля')
+        if options['clear']:
+            self.clear()
+        elif get_benchmark_users().exists():
+            raise CommandError(
+                'Тестовые данные уже созданы, используйте --clear'
+            )
+        if not Ingredient.objects.exists():
+            call_command('load_data', 'ingredients', stdout=self.stdout)
+
+        self.random = random.Random(options['seed'])
+        with transaction.atomic():
+            tags = self.create_tags(options['tags'])
+            users = self.create_users(options['users'])
+            recipes = self.create_recipes(users, tags, options['recipes'])
+            self.create_relations(users, recipes, options)
+        call_command('recount', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, рецептов: {len(recipes)}, '
+            f'тэгов: {len(tags)}; пароль пользователей: {PASSWORD}'
+        ))
+
+    def clear(self):
+        deleted, _ = get_benchmark_users().delete()
+        Tag.objects.filter(slug__startswith=TAG_PREFIX).delete()
+        bump_reference_version(Tag)
+        self.stdout.write(f'Удалено объектов: {deleted}')
+
+    def create_tags(self, count):
+        Tag.objects.bulk_create(
+            [
+                Tag(
+                    name=f'Benchmark {index}',
+                    color=f'#{0xbe0000 + index:06x}',
+                    slug=f'{TAG_PREFIX}{index}',
+                )
+                for index in range(count)
+            ],
+            ignore_conflicts=True
+        )
+        bump_reference_version(Tag)
+        return list(Tag.objects.filter(slug__startswith=TAG_PREFIX))
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            [
+                User(
+                    email=f'user{index}@{EMAIL_DOMAIN}',
+                    username=f'bench_user{index}',
+                    first_name='Benchmark',
+                    last_name=f'User {index}',
+                    password=password,
+                )
+                for index in range(count)
+            ],
+            batch_size=BATCH_SIZE
+        )
+        return list(get_benchmark_users().order_by('id'))
+
+    def get_image(self):
+        if not default_storage.exists(IMAGE_PATH):
+            buffer = BytesIO()
+            Image.new('RGB', (800, 600), '#c0a080').save(buffer, 'JPEG')
+            default_storage.save(IMAGE_PATH, ContentFile(buffer.getvalue()))
+        return IMAGE_PATH
+
+    def create_recipes(self, users, tags, per_user):
+        image = self.get_image()
+        Recipe.objects.bulk_create(
+            [
+                Recipe(
+                    author=user,
+                    name=f'Рецепт {index} пользователя {user.username}',
+                    image=image,
+                    text='Синтетический рецепт для нагрузочного теста.',
+                    cooking_time=self.random.randint(5, 180),
+                )
+                for user in users
+                for index in range(per_user)
+            ],
+            batch_size=BATCH_SIZE
+        )
+        recipes = list(Recipe.objects.filter(
+            author__in=users
+        ).values_list('id', flat=True))
+
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        low, high = INGREDIENTS_PER_RECIPE
+        IngredientAmount.objects.bulk_create(
+            [
+                IngredientAmount(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500),
+                )
+                for recipe_id in recipes
+                for ingredient_id in self.random.sample(
+                    ingredient_ids,
+                    min(self.random.randint(low, high), len(ingredient_ids))
+                )
+            ],
+            batch_size=BATCH_SIZE
+        )
+        if tags:
+            through = Recipe.tags.through
+            through.objects.bulk_create(
+                [
+                    through(recipe_id=recipe_id, tag_id=tag.id)
+                    for recipe_id in recipes
+                    for tag in self.random.sample(
+                        tags, self.random.randint(1, min(3, len(tags)))
+                    )
+                ],
+                batch_size=BATCH_SIZE
+            )
+        return recipes
+
+    def sample(self, population, count, exclude=None):
+        population = [item for item in population if item != exclude]
+        return self.random.sample(population, min(count, len(population)))
+
+    def create_relations(self, users, recipes, options):
+        user_ids = [user.id for user in users]
+        follows, favorites, cart = [], [], []
+        for user_id in user_ids:
+            follows.extend(
+                Follow(user_id=user_id, following_id=following_id)
+                for following_id in self.sample(
+                    user_ids, options['follows'], exclude=user_id
+                )
+            )
+            favorites.extend(
+                FavoriteRecipe(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in self.sample(recipes, options['favorites'])
+            )
+            cart.extend(
+                Shop(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in self.sample(recipes, options['cart'])
+            )
+        for model, objects in (
+                (Follow, follows), (FavoriteRecipe, favorites), (Shop, cart)):
+            model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+        followed = {}
+        for follow in follows:
+            followed.setdefault(follow.user_id, []).append(
+                follow.following_id
+            )
+        for user_id, author_ids in followed.items():
+            backfill_feed(user_id, author_ids)
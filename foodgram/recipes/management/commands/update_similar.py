@@ -0,0 +1,43 @@
+from time import monotonic
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.similar import update_similar_recipes
+
+
+class Command(BaseCommand):
+    help = 'Recalculate similar recipe lists for new and changed recipes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересчитать списки всех рецептов.'
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=settings.SIMILAR_RECIPES_TOP_K,
+            help='Количество похожих рецептов в списке.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество рецептов, сравниваемых за один шаг.'
+        )
+
+    def handle(self, *args, **options):
+        if options['top_k'] < 1 or options['batch_size'] < 1:
+            raise CommandError(
+                '--top-k и --batch-size должны быть больше нуля'
+            )
+        started = monotonic()
+        updated = update_similar_recipes(
+            options['top_k'], options['batch_size'], full=options['all']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {updated} '
+            f'за {monotonic() - started:.2f} с'
+        ))
@@ -10,7 +10,8 @@ class Ingredient(models.Model):
     name = models.CharField(
         max_length=200,
         verbose_name='Название',
-        null=False
+        null=False,
+        db_index=True
     )
     measurement_unit = models.CharField(
         max_length=20,
@@ -19,6 +20,12 @@ class Ingredient(models.Model):
     )
 
     class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient',
+            ),
+        )
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
@@ -70,10 +77,26 @@ class Recipe(models.Model):
         verbose_name='Картинка',
         upload_to='media/'
     )
+    image_renditions = models.JSONField(
+        verbose_name='Уменьшенные копии картинки',
+        default=dict,
+        editable=False
+    )
+    image_blurhash = models.CharField(
+        verbose_name='BlurHash картинки',
+        max_length=64,
+        blank=True,
+        editable=False
+    )
     text = models.TextField(
         max_length=2000,
         verbose_name='Описание'
     )
+    search_document = models.TextField(
+        verbose_name='Текст для поиска',
+        blank=True,
+        editable=False
+    )
     ingredients = models.ManyToManyField(
         Ingredient,
         through='IngredientAmount',
@@ -95,12 +118,47 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False
+    )
+    trending_score = models.FloatField(
+        verbose_name='Популярность с учётом времени',
+        default=0,
+        editable=False
+    )
+    trending_epoch = models.PositiveIntegerField(
+        verbose_name='Эпоха популярности',
+        default=0,
+        editable=False
+    )
+    similar_stale = models.BooleanField(
+        verbose_name='Нужно пересчитать похожие рецепты',
+        default=True,
+        editable=False,
+        db_index=True
+    )
 
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('-trending_score', '-id'),
+                name='recipe_trending_idx',
+            ),
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_popular_idx',
+            ),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -199,3 +257,111 @@ class Shop(models.Model):
 
     def __str__(self):
         return f'Рецепт {self.recipe} у пользователя {self.user}'
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_list',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+        related_name='shopping_list_items',
+    )
+    total = models.IntegerField(
+        verbose_name='Количество',
+        default=0
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item',
+            ),
+        )
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} – {self.total}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='feed',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='feed_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+        related_name='+',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_user_pub_date_idx',
+            ),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+
+    def __str__(self):
+        return f'{self.recipe} в ленте пользователя {self.user}'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='similar',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Похожий рецепт',
+        related_name='similar_to',
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'),
+                name='similar_recipe_score_idx',
+            ),
+        )
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.similar}: {self.score:.3f}'
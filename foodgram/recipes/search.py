@@ -0,0 +1,205 @@
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from math import log
+from threading import local
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, FloatField, Func, Prefetch, Value, When
+from django.db.models.functions import Cast
+
+from .cache import bump_reference_version
+from .indexes import VersionedIndex
+from .models import IngredientAmount, Recipe
+
+TOKEN_RE = re.compile(r'\w+')
+BATCH_SIZE = 500
+
+
+def build_search_document(name, text, ingredient_names):
+    return '\n'.join((name, text, *ingredient_names))
+
+
+def update_search_documents(queryset):
+    """Пересобирает поисковые документы рецептов пачками."""
+    queryset = queryset.order_by('id').only(
+        'id', 'name', 'text', 'search_document'
+    ).prefetch_related(Prefetch(
+        'recipe_ingredient',
+        queryset=IngredientAmount.objects.select_related('ingredient')
+    ))
+    updated = 0
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        for recipe in batch:
+            recipe.search_document = build_search_document(
+                recipe.name,
+                recipe.text,
+                (item.ingredient.name
+                 for item in recipe.recipe_ingredient.all())
+            )
+        Recipe.objects.bulk_update(batch, ('search_document',))
+        updated += len(batch)
+        last_id = batch[-1].id
+    bump_search_version(Recipe)
+    return updated
+
+
+_pending = local()
+
+
+def schedule_search_document_update(recipe_ids):
+    """Пересобирает документы рецептов после коммита транзакции.
+
+    Рецепты, затронутые в транзакции (сохранение рецепта в API или
+    админке, строки его ингредиентов, переименование ингредиента),
+    копятся в множестве потока; первый из запланированных вызовов
+    пересобирает их все одним update_search_documents, остальные
+    ничего не делают. Рецепты из откаченной транзакции пересоберутся
+    со следующей — документ всё равно строится по данным из БД.
+    """
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = set()
+    _pending.ids.update(recipe_ids)
+    transaction.on_commit(_update_pending_documents)
+
+
+def _update_pending_documents():
+    ids, _pending.ids = _pending.ids, set()
+    if ids:
+        update_search_documents(Recipe.objects.filter(id__in=ids))
+
+
+def recipe_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_search_document_update([instance.pk])
+
+
+def ingredient_amount_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_search_document_update([instance.recipe_id])
+
+
+def ingredient_changed(sender, instance, created=False, raw=False,
+                       **kwargs):
+    if created or raw:
+        return
+    schedule_search_document_update(IngredientAmount.objects.filter(
+        ingredient_id=instance.pk
+    ).values_list('recipe_id', flat=True).distinct())
+
+
+def bump_search_version(sender, **kwargs):
+    transaction.on_commit(lambda: bump_reference_version(sender))
+
+
+class DocumentVector(Func):
+    """to_tsvector по полю search_document.
+
+    Выражение совпадает с выражением GIN-индекса из signals.py,
+    поэтому Postgres может использовать индекс.
+    """
+    template = "to_tsvector('%(config)s'::regconfig, %(expressions)s)"
+
+    def __init__(self, expression, **extra):
+        from django.contrib.postgres.search import SearchVectorField
+        super().__init__(
+            expression,
+            config=settings.RECIPE_SEARCH_CONFIG,
+            output_field=SearchVectorField(),
+            **extra
+        )
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class RecipeSearchIndex:
+    """Инвертированный индекс рецептов в памяти процесса.
+
+    Используется вместо полнотекстового поиска Postgres на других СУБД.
+    Слово запроса совпадает со всеми словами индекса, которые с него
+    начинаются; рецепт должен содержать все слова запроса.
+    """
+
+    def __init__(self, rows):
+        self.postings = defaultdict(dict)
+        size = 0
+        for pk, document in rows:
+            size += 1
+            for token, count in Counter(tokenize(document)).items():
+                self.postings[token][pk] = count
+        self.size = size
+        self.vocabulary = sorted(self.postings)
+
+    def term_scores(self, term):
+        scores = {}
+        position = bisect_left(self.vocabulary, term)
+        while (position < len(self.vocabulary)
+               and self.vocabulary[position].startswith(term)):
+            postings = self.postings[self.vocabulary[position]]
+            idf = log(1 + self.size / len(postings))
+            for pk, count in postings.items():
+                scores[pk] = scores.get(pk, 0) + count * idf
+            position += 1
+        return scores
+
+    def search(self, query):
+        """Все подходящие рецепты: {id: счёт}."""
+        scores = None
+        for term in set(tokenize(query)):
+            term_scores = self.term_scores(term)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    pk: score + term_scores[pk]
+                    for pk, score in scores.items()
+                    if pk in term_scores
+                }
+            if not scores:
+                return {}
+        return scores or {}
+
+
+_index = VersionedIndex(Recipe._meta.model_name, lambda: RecipeSearchIndex(
+    Recipe.objects.values_list('id', 'search_document').iterator()
+))
+
+
+def get_recipe_search_index():
+    return _index.get()
+
+
+def search_recipes(queryset, query):
+    """Оставляет рецепты, подходящие под запрос, и добавляет search_rank."""
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        search_query = SearchQuery(
+            query,
+            config=settings.RECIPE_SEARCH_CONFIG,
+            search_type='websearch'
+        )
+        vector = DocumentVector('search_document')
+        return queryset.alias(search_vector=vector).filter(
+            search_vector=search_query
+        ).annotate(search_rank=Cast(
+            SearchRank(vector, search_query), FloatField()
+        ))
+
+    # Ограничивать совпадения здесь нельзя: фильтры по автору, тэгам,
+    # избранному и корзине и пагинатор применяются к queryset после.
+    matches = get_recipe_search_index().search(query)
+    return queryset.filter(id__in=matches.keys()).annotate(
+        search_rank=Case(
+            *(When(id=pk, then=Value(score))
+              for pk, score in matches.items()),
+            default=Value(0.0),
+            output_field=FloatField()
+        )
+    )
@@ -1,17 +1,25 @@
 from django.contrib.auth import get_user_model
-from django.db.models import F
-from drf_extra_fields.fields import Base64ImageField
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Prefetch, prefetch_related_objects
+from drf_extra_fields.fields import Base64ImageField, HybridImageField
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.validators import UniqueTogetherValidator
 
 
+from foodgram.user_flags import FAVORITE, SHOPPING_CART, get_user_flags
 from users.serializers import CurrentUserSerializer
+from .feed import schedule_feed_fanout
+from .images import reset_image_renditions, schedule_image_processing
 from .models import (
     Ingredient, IngredientAmount, FavoriteRecipe, Recipe, Shop, Tag
 )
+from .services import (
+    apply_shopping_list_deltas, get_cart_users, lock_recipe
+)
 
-User = get_user_model
+User = get_user_model()
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -38,9 +46,7 @@ class IngredientNumderSerializer(serializers.ModelSerializer):
 
 
 class AddIngredientNumderSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -69,36 +75,43 @@ class RecipeSerializer(serializers.ModelSerializer):
     favorite = serializers.SerializerMethodField()
     shop = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_renditions = serializers.SerializerMethodField()
+    image_blurhash = serializers.ReadOnlyField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'favorite',
-            'shop', 'name', 'image', 'text', 'cooking_time'
+            'shop', 'name', 'image', 'image_renditions', 'image_blurhash',
+            'text', 'cooking_time'
         )
 
     @staticmethod
     def get_ingredients(obj):
-        ingredients = IngredientAmount.objects.filter(recipe=obj)
+        ingredients = obj.recipe_ingredient.all()
         return IngredientNumderSerializer(ingredients, many=True).data
 
+    def get_image_renditions(self, obj):
+        request = self.context.get('request')
+        renditions = {}
+        for name, path in obj.image_renditions.items():
+            url = default_storage.url(path)
+            renditions[name] = (
+                request.build_absolute_uri(url) if request else url
+            )
+        return renditions
+
     def get_favorite(self, obj):
         request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        user = request.user
-        return FavoriteRecipe.objects.filter(recipe=obj, user=user).exists()
+        return obj.id in get_user_flags(request, FAVORITE)
 
     def get_shop(self, obj):
         request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        user = request.user
-        return Shop.objects.filter(recipe=obj, user=user).exists()
+        return obj.id in get_user_flags(request, SHOPPING_CART)
 
 
 class RecipeFullSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = HybridImageField()
     author = CurrentUserSerializer(read_only=True)
     ingredients = AddIngredientNumderSerializer(many=True)
     tags = serializers.PrimaryKeyRelatedField(
@@ -115,36 +128,88 @@ class RecipeFullSerializer(serializers.ModelSerializer):
         )
 
     def validate(self, data):
+        # При частичном обновлении непереданные поля не проверяются.
         tags = data.get('tags')
-        if len(tags) != len(set([item for item in tags])):
+        if tags is not None and len(tags) != len(set(tags)):
             raise serializers.ValidationError(
                 {'tags': 'Тэги не могут повторяться'}
             )
         cooking_time = data.get('cooking_time')
-        if cooking_time > 300 or cooking_time < 1:
+        if cooking_time is not None and (
+                cooking_time > 300 or cooking_time < 1):
             raise serializers.ValidationError(
                 {'cooking_time': 'Время приготовления от 1 до 300 минут'}
             )
         amount = data.get('ingredients')
+        if amount is None:
+            return data
         if [item for item in amount if item['amount'] < 1]:
             raise serializers.ValidationError(
                 {'amount': 'Минимальное количество ингредиентов = 1'}
             )
+        ingredient_ids = {item['id'] for item in amount}
+        found = Ingredient.objects.filter(id__in=ingredient_ids).count()
+        if found != len(ingredient_ids):
+            raise serializers.ValidationError(
+                {'ingredients': 'Ингредиент не найден'}
+            )
         return data
 
     @staticmethod
-    def add_ingredients(ingredients, recipe):
+    def merge_ingredients(ingredients):
+        amounts = {}
         for ingredient in ingredients:
             ingredient_id = ingredient['id']
-            amount = ingredient['amount']
-            if IngredientAmount.objects.filter(
-                    recipe=recipe, ingredient=ingredient_id).exists():
-                amount += F('amount')
-            IngredientAmount.objects.update_or_create(
-                recipe=recipe, ingredient=ingredient_id,
-                defaults={'amount': amount}
+            amounts[ingredient_id] = (
+                amounts.get(ingredient_id, 0) + ingredient['amount']
             )
+        return amounts
 
+    @staticmethod
+    def add_ingredients(amounts, recipe):
+        IngredientAmount.objects.bulk_create([
+            IngredientAmount(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+        ])
+
+    def update_ingredients(self, amounts, recipe):
+        lock_recipe(recipe.pk)
+        current = {
+            item.ingredient_id: item
+            for item in IngredientAmount.objects.filter(recipe=recipe)
+        }
+        removed = current.keys() - amounts.keys()
+        deltas = {
+            ingredient_id: -item.amount
+            for ingredient_id, item in current.items()
+        }
+        for ingredient_id, amount in amounts.items():
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) + amount
+        apply_shopping_list_deltas(get_cart_users(recipe.pk), deltas)
+        if removed:
+            IngredientAmount.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id in current.keys() & amounts.keys():
+            item = current[ingredient_id]
+            if item.amount != amounts[ingredient_id]:
+                item.amount = amounts[ingredient_id]
+                changed.append(item)
+        if changed:
+            IngredientAmount.objects.bulk_update(changed, ('amount',))
+        self.add_ingredients(
+            {
+                ingredient_id: amount
+                for ingredient_id, amount in amounts.items()
+                if ingredient_id not in current
+            },
+            recipe
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         tags_data = validated_data.pop('tags')
@@ -152,21 +217,44 @@ class RecipeFullSerializer(serializers.ModelSerializer):
         image = validated_data.pop('image')
         recipe = Recipe.objects.create(image=image, author=author,
                                        **validated_data)
-        self.add_ingredients(ingredient_data, recipe)
+        User.objects.filter(pk=author.pk).update(
+            recipes_count=F('recipes_count') + 1
+        )
+        transaction.on_commit(lambda: schedule_image_processing(recipe.pk))
+        transaction.on_commit(lambda: schedule_feed_fanout(recipe.pk))
+        self.add_ingredients(self.merge_ingredients(ingredient_data), recipe)
         recipe.tags.set(tags_data)
         return recipe
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        prefetch_related_objects(
+            [instance],
+            Prefetch(
+                'recipe_ingredient',
+                queryset=IngredientAmount.objects.select_related('ingredient')
+            ),
+            'tags',
+        )
         return RecipeSerializer(instance, context=context).data
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        IngredientAmount.objects.filter(recipe=recipe).delete()
-        self.add_ingredients(ingredients, recipe)
-        recipe.tags.set(tags)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        if ingredients is not None:
+            self.update_ingredients(
+                self.merge_ingredients(ingredients), recipe
+            )
+        if tags is not None:
+            recipe.tags.set(tags)
+        recipe.similar_stale = True
+        if 'image' in validated_data:
+            reset_image_renditions(recipe)
+            transaction.on_commit(
+                lambda: schedule_image_processing(recipe.pk)
+            )
         return super().update(recipe, validated_data)
 
 
@@ -1,21 +1,146 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import (
+    Case, F, IntegerField, Sum, Value, When, Window
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+
+from .models import IngredientAmount, Recipe, Shop, ShoppingListItem
+
+CHUNK_SIZE = 2000
+
+User = get_user_model()
+
+
 def get_header_message(queryset):
 
     recipes_list = (', '.join([cart.recipe.name for cart in queryset]))
     return f'Вы добавили в корзину ингредиенты для: {recipes_list}.'
 
 
-def get_total_list(queryset):
+def get_total_list(user):
+
+    return ShoppingListItem.objects.filter(user=user).values(
+        'ingredient__name', 'ingredient__measurement_unit', 'total'
+    ).order_by('ingredient__name', 'ingredient__measurement_unit')
+
+
+def get_recipe_amounts(recipe_id, sign=1):
+    return {
+        ingredient_id: amount * sign
+        for ingredient_id, amount in IngredientAmount.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('ingredient_id', 'amount')
+    }
+
+
+def lock_recipe(recipe_id):
+    """Блокирует строку рецепта до конца транзакции.
+
+    Состав рецепта и список корзин, в которых он лежит, читаются после
+    блокировки, так что правка рецепта и добавление его в корзину
+    не считают изменения списков покупок по устаревшим данным.
+    """
+    list(Recipe.objects.select_for_update().filter(
+        pk=recipe_id
+    ).values_list('pk', flat=True))
+
+
+def get_cart_users(recipe_id):
+    return Shop.objects.filter(recipe_id=recipe_id).values_list(
+        'user_id', flat=True
+    )
+
+
+def apply_shopping_list_deltas(user_ids, deltas):
+    """Прибавляет к итогам списков покупок изменения {ingredient_id: n}.
+
+    Недостающие строки создаются с нулём, затем все строки обновляются
+    одним UPDATE, а обнулившиеся удаляются. Строки пользователей
+    блокируются в порядке id, поэтому параллельные изменения одного
+    списка выполняются по очереди и удаление обнулившейся строки
+    не теряет чужую прибавку.
+    """
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    if not deltas:
+        return
+    users = list(user_ids)
+    if not users:
+        return
+    with transaction.atomic():
+        _apply_deltas(users, deltas)
+
+
+def _apply_deltas(users, deltas):
+    list(User.objects.select_for_update().filter(
+        pk__in=users
+    ).order_by('pk').values_list('pk', flat=True))
+    ShoppingListItem.objects.bulk_create(
+        [
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+            for user_id in users
+            for ingredient_id, delta in deltas.items() if delta > 0
+        ],
+        batch_size=CHUNK_SIZE,
+        ignore_conflicts=True
+    )
+    items = ShoppingListItem.objects.filter(
+        user_id__in=users, ingredient_id__in=deltas.keys()
+    )
+    items.update(total=F('total') + Case(
+        *(
+            When(ingredient_id=ingredient_id, then=Value(delta))
+            for ingredient_id, delta in deltas.items()
+        ),
+        default=Value(0),
+        output_field=IntegerField()
+    ))
+    items.filter(total__lte=0).delete()
+
+
+def rebuild_shopping_lists():
+    """Пересчитывает итоги всех списков покупок с нуля."""
+    ShoppingListItem.objects.all().delete()
+    rows = IngredientAmount.objects.filter(
+        recipe__shopping_recipe__isnull=False
+    ).values(
+        'recipe__shopping_recipe__user', 'ingredient'
+    ).annotate(total=Sum('amount')).order_by().iterator(
+        chunk_size=CHUNK_SIZE
+    )
+    created = 0
+    batch = []
+    for row in rows:
+        batch.append(ShoppingListItem(
+            user_id=row['recipe__shopping_recipe__user'],
+            ingredient_id=row['ingredient'],
+            total=row['total'],
+        ))
+        if len(batch) == CHUNK_SIZE:
+            ShoppingListItem.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    ShoppingListItem.objects.bulk_create(batch)
+    return created + len(batch)
+
 
-    total_list = {}
+def get_latest_recipes(author_ids, limit):
 
-    for cart in queryset:
-        r_ingredients = cart.recipe.recipe_ingredient.all()
-        for r_ingredient in r_ingredients:
-            name = r_ingredient.ingredient.name
-            amount = r_ingredient.amount
-            unit = r_ingredient.ingredient.measurement_unit
-            if total_list.get(name) is None:
-                total_list[name] = {unit: amount}
-            else:
-                total_list[name][unit] += amount
-    return total_list
+    if not author_ids:
+        return Recipe.objects.none()
+    ranked = Recipe.objects.filter(author_id__in=author_ids).annotate(
+        recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc()),
+        )
+    ).order_by().values('id', 'recipe_rank')
+    sql, params = ranked.query.sql_with_params()
+    return Recipe.objects.filter(id__in=RawSQL(
+        f'SELECT id FROM ({sql}) ranked WHERE recipe_rank <= %s',
+        (*params, limit)
+    ))
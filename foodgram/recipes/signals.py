@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.db import connections
+
+INGREDIENT_NAME_TRGM_INDEX = 'recipes_ingredient_name_trgm'
+RECIPE_SEARCH_INDEX = 'recipes_recipe_search_document_gin'
+RECIPE_TAG_INDEX = 'recipes_recipe_tags_tag_recipe_idx'
+
+
+def create_indexes(using='default', **kwargs):
+    """Создаёт индексы, которые не описываются через Meta.indexes."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {RECIPE_TAG_INDEX} '
+            'ON recipes_recipe_tags (tag_id, recipe_id)'
+        )
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {INGREDIENT_NAME_TRGM_INDEX} '
+            'ON recipes_ingredient '
+            'USING gin (UPPER(name::text) gin_trgm_ops)'
+        )
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {RECIPE_SEARCH_INDEX} '
+            'ON recipes_recipe USING gin (to_tsvector('
+            f"'{settings.RECIPE_SEARCH_CONFIG}'::regconfig, search_document))"
+        )
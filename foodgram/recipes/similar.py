@@ -0,0 +1,172 @@
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min
+from scipy import sparse
+
+from .models import IngredientAmount, Recipe, SimilarRecipe
+from .services import CHUNK_SIZE
+
+
+def _pairs(queryset):
+    """Столбцы пары значений values_list в виде двух массивов NumPy."""
+    flat = np.fromiter(
+        (value for pair in queryset.iterator(chunk_size=CHUNK_SIZE)
+         for value in pair),
+        dtype=np.int64
+    )
+    return flat[0::2], flat[1::2]
+
+
+def build_feature_matrix():
+    """Разреженная матрица рецепт × (ингредиенты и тэги) с весами TF-IDF.
+
+    Возвращает отсортированный массив id рецептов и матрицу CSR, строки
+    которой нормированы, так что произведение строк — косинусное сходство.
+    """
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('id').values_list('id', flat=True).iterator(
+            chunk_size=CHUNK_SIZE
+        ),
+        dtype=np.int64
+    )
+    ingredient_recipes, ingredients = _pairs(
+        IngredientAmount.objects.values_list('recipe_id', 'ingredient_id')
+    )
+    tag_recipes, tags = _pairs(
+        Recipe.tags.through.objects.values_list('recipe_id', 'tag_id')
+    )
+    _, ingredient_columns = np.unique(ingredients, return_inverse=True)
+    _, tag_columns = np.unique(tags, return_inverse=True)
+    offset = ingredient_columns.max() + 1 if len(ingredients) else 0
+    rows = np.searchsorted(
+        recipe_ids, np.concatenate((ingredient_recipes, tag_recipes))
+    )
+    columns = np.concatenate((ingredient_columns, tag_columns + offset))
+    shape = (len(recipe_ids), int(columns.max()) + 1 if len(columns) else 0)
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, columns)), shape=shape
+    )
+    matrix.data[:] = 1
+    document_frequency = np.bincount(matrix.indices, minlength=shape[1])
+    idf = np.log(shape[0] / np.maximum(document_frequency, 1)) + 1
+    matrix = matrix.multiply(idf).tocsr()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return recipe_ids, (sparse.diags(1 / norms) @ matrix).tocsr()
+
+
+def _neighbours(scores, row, position, top_k):
+    start, end = scores.indptr[row], scores.indptr[row + 1]
+    columns = scores.indices[start:end]
+    values = scores.data[start:end]
+    keep = (columns != position) & (values > 0)
+    columns, values = columns[keep], values[keep]
+    if len(values) > top_k:
+        best = np.argpartition(-values, top_k)[:top_k]
+        columns, values = columns[best], values[best]
+    return columns, values
+
+
+def _rebuild_lists(recipe_ids, matrix, batch, top_k):
+    """Заново записывает списки рецептов batch (позиции в recipe_ids).
+
+    Возвращает матрицу сходства рецептов batch со всеми рецептами.
+    """
+    scores = (matrix[batch] @ matrix.T).tocsr()
+    entries = []
+    for row, position in enumerate(batch):
+        recipe_id = int(recipe_ids[position])
+        columns, values = _neighbours(scores, row, position, top_k)
+        for column, value in zip(columns.tolist(), values.tolist()):
+            entries.append(SimilarRecipe(
+                recipe_id=recipe_id,
+                similar_id=int(recipe_ids[column]),
+                score=value
+            ))
+    batch_ids = recipe_ids[batch].tolist()
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=batch_ids).delete()
+        SimilarRecipe.objects.bulk_create(entries, batch_size=CHUNK_SIZE)
+        Recipe.objects.filter(id__in=batch_ids).update(similar_stale=False)
+    return scores
+
+
+def update_similar_recipes(top_k, batch_size, full=False):
+    """Пересчитывает списки похожих рецептов.
+
+    Без full пересчитываются только новые и изменённые рецепты
+    (similar_stale); они же добавляются в списки остальных рецептов,
+    если попадают в их top_k. Списки, где изменённый рецепт уже был,
+    пересчитываются целиком: его прежнее сходство могло устареть.
+    """
+    recipe_ids, matrix = build_feature_matrix()
+    stale = Recipe.objects.all() if full else Recipe.objects.filter(
+        similar_stale=True
+    )
+    targets = np.searchsorted(recipe_ids, np.fromiter(
+        stale.order_by('id').values_list('id', flat=True), dtype=np.int64
+    ))
+    if not len(targets):
+        return 0
+    affected = np.zeros(0, dtype=np.int64)
+    # Порог попадания нового рецепта в чужой список: худшее сходство
+    # в заполненном списке, для рецептов из targets и affected,
+    # которые пересчитываются целиком, — бесконечность.
+    thresholds = np.zeros(len(recipe_ids))
+    if not full:
+        affected = np.searchsorted(recipe_ids, np.fromiter(
+            SimilarRecipe.objects.filter(
+                similar__similar_stale=True, recipe__similar_stale=False
+            ).values_list('recipe_id', flat=True).distinct().order_by(
+                'recipe_id'
+            ),
+            dtype=np.int64
+        ))
+        SimilarRecipe.objects.filter(similar__similar_stale=True).delete()
+        for row in SimilarRecipe.objects.values('recipe').annotate(
+                total=Count('id'), lowest=Min('score')).order_by():
+            if row['total'] >= top_k:
+                position = np.searchsorted(recipe_ids, row['recipe'])
+                thresholds[position] = row['lowest']
+        thresholds[affected] = np.inf
+    thresholds[targets] = np.inf
+    candidates = {}
+
+    for start in range(0, len(targets), batch_size):
+        batch = targets[start:start + batch_size]
+        scores = _rebuild_lists(recipe_ids, matrix, batch, top_k)
+        if not full:
+            scores = scores.tocoo()
+            better = scores.data > thresholds[scores.col]
+            for row, column, value in zip(scores.row[better].tolist(),
+                                          scores.col[better].tolist(),
+                                          scores.data[better].tolist()):
+                candidates.setdefault(int(recipe_ids[column]), []).append(
+                    (int(recipe_ids[batch[row]]), value)
+                )
+
+    for start in range(0, len(affected), batch_size):
+        _rebuild_lists(
+            recipe_ids, matrix, affected[start:start + batch_size], top_k
+        )
+
+    for other_id, pairs in candidates.items():
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(
+                recipe_id=other_id,
+                similar_id__in=[similar_id for similar_id, _ in pairs]
+            ).delete()
+            SimilarRecipe.objects.bulk_create([
+                SimilarRecipe(
+                    recipe_id=other_id, similar_id=similar_id, score=score
+                )
+                for similar_id, score in pairs
+            ])
+            keep = SimilarRecipe.objects.filter(
+                recipe_id=other_id
+            ).order_by('-score').values_list('id', flat=True)[:top_k]
+            SimilarRecipe.objects.filter(recipe_id=other_id).exclude(
+                id__in=list(keep)
+            ).delete()
+    return len(targets)
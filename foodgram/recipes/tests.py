@@ -0,0 +1,905 @@
+import asyncio
+import json
+import shutil
+import tempfile
+from base64 import b64encode, urlsafe_b64decode
+from datetime import datetime, timezone
+from io import BytesIO, StringIO
+from threading import Barrier
+from time import time
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db.backends.signals import connection_created
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from foodgram import async_views
+from foodgram.user_flags import (
+    FAVORITE, KEY, get_flag_versions, invalidate_user_flags, load_user_flags
+)
+from users.models import CustomUser, Follow
+from . import exporters
+from .cache import bump_reference_version
+from .images import reset_image_renditions
+from .indexes import VersionedIndex
+from .management.commands import load_data
+from .models import (
+    FavoriteRecipe, FeedEntry, Ingredient, IngredientAmount, Recipe, Shop,
+    ShoppingListItem, SimilarRecipe, Tag
+)
+from .search import update_search_documents
+from .trending import add_trending, get_epoch
+from .views import RecipeViewSet
+
+CONCURRENT_REQUESTS = 4
+RECIPES = 8
+
+
+def create_user(username):
+    return CustomUser.objects.create_user(
+        email=f'{username}@foodgram.local', username=username,
+        password=username, first_name='Имя', last_name='Фамилия'
+    )
+
+
+def create_recipes(author, count):
+    tags = [
+        Tag.objects.create(
+            name=f'Тэг {index}', color=f'#00000{index}', slug=f'tag-{index}'
+        )
+        for index in range(2)
+    ]
+    ingredients = [
+        Ingredient.objects.create(
+            name=f'Ингредиент {index}', measurement_unit='г'
+        )
+        for index in range(3)
+    ]
+    recipes = []
+    for index in range(count):
+        recipe = Recipe.objects.create(
+            author=author, name=f'Рецепт {index}',
+            image='recipes/test.jpg', text='Текст', cooking_time=10
+        )
+        recipe.tags.set(tags)
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe=recipe, ingredient=ingredient, amount=index + 1
+            )
+            for ingredient in ingredients
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+async def asgi_request(path, token=None, method='GET'):
+    """Запрос через ASGI-приложение, как его вызывает uvicorn."""
+    headers = [(b'host', b'testserver')]
+    if token is not None:
+        headers.append((b'authorization', f'Token {token}'.encode()))
+    communicator = ApplicationCommunicator(get_asgi_application(), {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'root_path': '',
+        'query_string': b'',
+        'headers': headers,
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 0),
+    })
+    await communicator.send_input({'type': 'http.request', 'body': b''})
+    start = await communicator.receive_output(10)
+    body = b''
+    while True:
+        message = await communicator.receive_output(10)
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    await communicator.wait(10)
+    return start['status'], body
+
+
+class AsgiConcurrencyTest(TransactionTestCase):
+    """Под ASGI GET-запросы не ждут друг друга, и каждый открывает
+    не больше двух соединений с БД: своё и для загрузки флагов."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('user')
+        author = create_user('author')
+        self.token = Token.objects.create(user=self.user).key
+        recipe = create_recipes(author, 3)[-1]
+        FavoriteRecipe.objects.create(user=self.user, recipe=recipe)
+        Shop.objects.create(user=self.user, recipe=recipe)
+        Follow.objects.create(user=self.user, following=author)
+        self.opened = []
+        connection_created.connect(self.count_connection)
+        self.addCleanup(
+            connection_created.disconnect, self.count_connection
+        )
+
+    def count_connection(self, sender, connection, **kwargs):
+        self.opened.append(connection.alias)
+
+    def get_concurrently(self):
+        async def run():
+            return await asyncio.gather(*(
+                asgi_request('/api/recipes/', self.token)
+                for _ in range(CONCURRENT_REQUESTS)
+            ))
+        return asyncio.run(run())
+
+    def test_requests_run_concurrently(self):
+        # Каждое представление ждёт, пока до этой точки дойдут все
+        # запросы; если бы они выполнялись по очереди, барьер сломался бы.
+        barrier = Barrier(CONCURRENT_REQUESTS, timeout=10)
+        original = RecipeViewSet.list
+
+        def list_after_barrier(view, request, *args, **kwargs):
+            barrier.wait()
+            return original(view, request, *args, **kwargs)
+
+        with mock.patch.object(RecipeViewSet, 'list', list_after_barrier):
+            responses = self.get_concurrently()
+        self.assertEqual(
+            [status for status, _ in responses],
+            [200] * CONCURRENT_REQUESTS
+        )
+        self.assertFalse(barrier.broken)
+
+    def test_connections_per_request(self):
+        self.get_concurrently()
+        self.assertLessEqual(len(self.opened), 2 * CONCURRENT_REQUESTS)
+        # Флаги уже в кэше: запросу хватает одного соединения.
+        self.opened.clear()
+        self.get_concurrently()
+        self.assertLessEqual(len(self.opened), CONCURRENT_REQUESTS)
+
+    def test_flags_are_loaded_for_the_user(self):
+        status, body = asyncio.run(asgi_request('/api/recipes/', self.token))
+        self.assertEqual(status, 200)
+        self.assertIn(b'"favorite":true', body)
+        self.assertIn(b'"shop":true', body)
+        self.assertIn(b'"is_signed":true', body)
+
+    def test_writes_bypass_read_pool(self):
+        with mock.patch.object(async_views, 'get_executor') as executor:
+            status, _ = asyncio.run(
+                asgi_request('/api/recipes/', self.token, method='POST')
+            )
+        self.assertEqual(status, 400)
+        executor.assert_not_called()
+
+
+class RecipeQueryCountTest(TestCase):
+    """Число запросов к БД для списка и карточки рецепта.
+
+    Не должно зависеть от числа рецептов на странице.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        author = create_user('author')
+        cls.token = Token.objects.create(user=cls.user).key
+        cls.recipe = create_recipes(author, RECIPES)[-1]
+        FavoriteRecipe.objects.create(user=cls.user, recipe=cls.recipe)
+        Shop.objects.create(user=cls.user, recipe=cls.recipe)
+        Follow.objects.create(user=cls.user, following=author)
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def assert_queries(self, client, url, count):
+        with self.assertNumQueries(count):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list_anonymous(self):
+        for limit in (1, RECIPES):
+            self.assert_queries(
+                self.anonymous, f'/api/recipes/?limit={limit}', 4
+            )
+
+    def test_list_authenticated(self):
+        for limit in (1, RECIPES):
+            cache.clear()
+            self.assert_queries(
+                self.client, f'/api/recipes/?limit={limit}', 8
+            )
+
+    def test_list_authenticated_cached_flags(self):
+        self.client.get('/api/recipes/')
+        self.assert_queries(self.client, '/api/recipes/', 5)
+
+    def test_retrieve_anonymous(self):
+        self.assert_queries(
+            self.anonymous, f'/api/recipes/{self.recipe.id}/', 3
+        )
+
+    def test_retrieve_authenticated(self):
+        response = self.assert_queries(
+            self.client, f'/api/recipes/{self.recipe.id}/', 7
+        )
+        self.assertTrue(response.data['favorite'])
+        self.assertTrue(response.data['shop'])
+        self.assertTrue(response.data['author']['is_signed'])
+
+
+class UserFlagsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.token = Token.objects.create(user=cls.user).key
+        cls.recipes = create_recipes(create_user('author'), 3)
+        FavoriteRecipe.objects.create(user=cls.user, recipe=cls.recipes[0])
+        Shop.objects.create(user=cls.user, recipe=cls.recipes[1])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def get_ids(self, client, query):
+        response = client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_filters(self):
+        self.assertEqual(
+            self.get_ids(self.client, 'is_favorited=1'),
+            [self.recipes[0].id]
+        )
+        self.assertEqual(
+            self.get_ids(self.client, 'is_in_shopping_cart=1'),
+            [self.recipes[1].id]
+        )
+        self.assertEqual(self.get_ids(APIClient(), 'is_favorited=1'), [])
+
+    def test_stale_load_is_not_read_after_invalidation(self):
+        version = get_flag_versions(self.user.id, (FAVORITE,))[FAVORITE]
+        with self.captureOnCommitCallbacks(execute=True):
+            FavoriteRecipe.objects.create(
+                user=self.user, recipe=self.recipes[2]
+            )
+            invalidate_user_flags(self.user.id, FAVORITE)
+        # Параллельный запрос прочитал множество до изменения
+        # и записывает его после.
+        cache.set(
+            KEY.format(FAVORITE, self.user.id, version),
+            frozenset([self.recipes[0].id])
+        )
+        self.assertEqual(
+            load_user_flags(self.user.id, (FAVORITE,))[FAVORITE],
+            frozenset([self.recipes[0].id, self.recipes[2].id])
+        )
+
+
+class ImageRenditionsTest(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        buffer = BytesIO()
+        Image.new('RGB', (64, 48), 'red').save(buffer, 'JPEG')
+        default_storage.save('recipes/test.jpg', ContentFile(buffer.getvalue()))
+        self.recipe = create_recipes(create_user('author'), 1)[0]
+
+    def test_reprocess_images_fills_missing(self):
+        call_command('reprocess_images', stdout=StringIO())
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image_blurhash)
+        self.assertEqual(len(self.recipe.image_renditions), 4)
+        for path in self.recipe.image_renditions.values():
+            self.assertTrue(default_storage.exists(path))
+
+    def test_reset_clears_stale_renditions(self):
+        call_command('reprocess_images', stdout=StringIO())
+        self.recipe.refresh_from_db()
+        stale = list(self.recipe.image_renditions.values())
+        with self.captureOnCommitCallbacks(execute=True):
+            reset_image_renditions(self.recipe)
+            self.recipe.save()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_renditions, {})
+        self.assertEqual(self.recipe.image_blurhash, '')
+        for path in stale:
+            self.assertFalse(default_storage.exists(path))
+
+
+class ServerTimingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_recipes(create_user('author'), 2)
+
+    def test_render_time_is_reported(self):
+        with self.assertLogs('foodgram.requests', 'INFO') as logs:
+            response = APIClient().get('/api/recipes/')
+        self.assertEqual(
+            [metric.split(';')[0]
+             for metric in response['Server-Timing'].split(', ')],
+            ['db', 'render', 'app', 'total']
+        )
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertGreater(record['render_ms'], 0)
+
+
+class RecipePartialUpdateTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.token = Token.objects.create(user=cls.author).key
+        cls.recipe = create_recipes(cls.author, 1)[0]
+
+    def test_patch_name_keeps_other_fields(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(
+                f'/api/recipes/{self.recipe.id}/', {'name': 'Борщ'},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Борщ')
+        self.assertEqual(self.recipe.tags.count(), 2)
+        self.assertEqual(self.recipe.recipe_ingredient.count(), 3)
+        self.assertEqual(
+            self.recipe.search_document.split('\n'),
+            ['Борщ', 'Текст', 'Ингредиент 0', 'Ингредиент 1', 'Ингредиент 2']
+        )
+
+
+@override_settings(INDEX_REBUILD_ASYNC=True)
+class VersionedIndexTest(TestCase):
+
+    def test_rebuild_does_not_block_readers(self):
+        builds = []
+        index = VersionedIndex(Recipe._meta.model_name, lambda: (
+            builds.append(None) or len(builds)
+        ))
+        self.assertEqual(index.get(), 1)
+        bump_reference_version(Recipe)
+        with mock.patch('recipes.indexes.get_executor') as executor:
+            # Пока новый индекс строится, читается прежний,
+            # и вторая перестройка не запускается.
+            self.assertEqual(index.get(), 1)
+            self.assertEqual(index.get(), 1)
+        executor.return_value.submit.assert_called_once()
+        function, version = executor.return_value.submit.call_args[0]
+        with mock.patch('recipes.indexes.connection'):
+            function(version)
+        self.assertEqual(index.get(), 2)
+        self.assertEqual(len(builds), 2)
+
+
+class WhatToCookTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = create_recipes(create_user('author'), 1)[0]
+        cls.ingredient_id = cls.recipe.recipe_ingredient.first().ingredient_id
+
+    def get(self, min_coverage):
+        return APIClient().get('/api/recipes/what_to_cook/', {
+            'ingredients': self.ingredient_id, 'min_coverage': min_coverage
+        })
+
+    def test_min_coverage(self):
+        response = self.get('0.3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.recipe.id]
+        )
+        self.assertEqual(self.get('0.5').data['results'], [])
+        for value in ('-0.1', '1.5', 'nan', 'inf'):
+            with self.subTest(value=value):
+                self.assertEqual(self.get(value).status_code, 400)
+
+
+class ShoppingListTotalsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.user = create_user('user')
+        cls.recipe = create_recipes(cls.author, 1)[0]
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def totals(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.user
+        ).values_list('ingredient__name', 'total'))
+
+    def test_totals_follow_cart_and_recipe(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        user = self.client_for(self.user)
+        self.assertEqual(user.post(f'{url}shopping_cart/').status_code, 201)
+        self.assertEqual(self.totals(), {
+            'Ингредиент 0': 1, 'Ингредиент 1': 1, 'Ингредиент 2': 1
+        })
+        ingredient = Ingredient.objects.get(name='Ингредиент 0')
+        response = self.client_for(self.author).patch(url, {
+            'ingredients': [{'id': ingredient.id, 'amount': 5}]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.totals(), {'Ингредиент 0': 5})
+        self.assertEqual(user.delete(f'{url}shopping_cart/').status_code, 204)
+        self.assertEqual(self.totals(), {})
+
+    def test_admin_edits_update_totals(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.client_for(self.user).post(f'{url}shopping_cart/')
+        admin = create_user('admin')
+        CustomUser.objects.filter(pk=admin.pk).update(
+            is_staff=True, is_superuser=True
+        )
+        self.client.force_login(admin)
+        change_url = f'/admin/recipes/recipe/{self.recipe.id}/change/'
+        context = self.client.get(change_url).context
+        formset = context['inline_admin_formsets'][0].formset
+        data = {}
+        for form in (context['adminform'].form, formset.management_form,
+                     *formset.forms):
+            for field in form:
+                value = field.value()
+                widget = field.field.widget
+                if value is not None and not widget.needs_multipart_form:
+                    data[field.html_name] = value
+        amounts = {
+            form.instance.ingredient.name: form.prefix
+            for form in formset.initial_forms
+        }
+        data[f'{amounts["Ингредиент 0"]}-amount'] = 4
+        data[f'{amounts["Ингредиент 1"]}-DELETE'] = 'on'
+        self.assertEqual(self.client.post(change_url, data).status_code, 302)
+        self.assertEqual(self.totals(), {'Ингредиент 0': 4, 'Ингредиент 2': 1})
+        response = self.client.post(
+            f'/admin/recipes/recipe/{self.recipe.id}/delete/', {'post': 'yes'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.totals(), {})
+
+
+class TrendingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.old, cls.new = create_recipes(create_user('author'), 2)
+
+    def get_ids(self, query):
+        response = APIClient().get(f'/api/recipes/?ordering=trending&{query}')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def epoch_start(self, epoch):
+        return settings.TRENDING_REFERENCE_TIME + (
+            epoch * settings.TRENDING_RESCALE_EXPONENT
+            * settings.TRENDING_HALF_LIFE
+        )
+
+    def test_older_events_weigh_less(self):
+        now = time()
+        # Пять добавлений неделю назад весят меньше одного сегодняшнего.
+        for _ in range(5):
+            add_trending(self.old.id, 1, now=now - 7 * 24 * 60 * 60)
+        add_trending(self.new.id, 1, now=now)
+        self.old.refresh_from_db()
+        self.new.refresh_from_db()
+        self.assertLess(self.old.trending_score, self.new.trending_score)
+        self.assertEqual(self.get_ids(''), [self.new.id, self.old.id])
+
+    def test_new_epoch_rescales_all_rows(self):
+        epoch = get_epoch() + 1
+        day = 24 * 60 * 60
+        add_trending(self.old.id, 1, now=self.epoch_start(epoch + 1) - day)
+        self.assertEqual(self.get_ids(''), [self.old.id, self.new.id])
+        add_trending(self.new.id, 1, now=self.epoch_start(epoch + 1) + day)
+        self.old.refresh_from_db()
+        self.new.refresh_from_db()
+        self.assertEqual(self.old.trending_epoch, epoch + 1)
+        self.assertAlmostEqual(
+            self.new.trending_score / self.old.trending_score,
+            2 ** (2 * day / settings.TRENDING_HALF_LIFE)
+        )
+        self.assertEqual(self.get_ids(''), [self.new.id, self.old.id])
+
+    def test_pages_by_number_even_with_cursor(self):
+        add_trending(self.old.id, 1)
+        self.assertEqual(
+            self.get_ids('limit=1&cursor=&page=2'), [self.new.id]
+        )
+
+
+class ExportPdfTest(SimpleTestCase):
+
+    def test_stops_reading_rows_after_line_cap(self):
+        read = []
+
+        def rows():
+            for index in range(exporters.PDF_MAX_LINES * 2):
+                read.append(index)
+                yield {
+                    'ingredient__name': f'Ингредиент {index}',
+                    'ingredient__measurement_unit': 'г',
+                    'total': index,
+                }
+
+        with mock.patch.object(exporters, 'PDF_MAX_LINES', 10):
+            document = b''.join(exporters.export_pdf('Заголовок', rows()))
+        self.assertTrue(document.startswith(b'%PDF'))
+        self.assertEqual(len(read), 11)
+
+
+@mock.patch.object(load_data, 'READ_SIZE', 3)
+class ReadJsonTest(SimpleTestCase):
+    fields = ('name', 'measurement_unit')
+
+    def read(self, text):
+        return list(load_data.read_json(StringIO(text), self.fields))
+
+    def test_values_split_across_chunks(self):
+        self.assertEqual(self.read(
+            '  \n [{"name": "Картофель молодой", "measurement_unit": "г"},'
+            ' {"name": "Соль", "measurement_unit": "щепотка"}]'
+        ), [
+            {'name': 'Картофель молодой', 'measurement_unit': 'г'},
+            {'name': 'Соль', 'measurement_unit': 'щепотка'},
+        ])
+
+    def test_escaped_quotes_and_nested_objects(self):
+        self.assertEqual(self.read(
+            '[{"name": "Соус \\"Тар-тар\\" ]}", "measurement_unit": "мл",'
+            ' "extra": {"tags": [{"a": "}]"}], "n": [1, [2]]}},'
+            ' {"name": "Без единицы"}]'
+        ), [{'name': 'Соус "Тар-тар" ]}', 'measurement_unit': 'мл'}])
+
+    def test_truncated_file(self):
+        with self.assertRaises(CommandError):
+            self.read('[{"name": "Соль", "measurement_unit": "г"}, {"na')
+
+    def test_not_an_array(self):
+        with self.assertRaises(CommandError):
+            self.read('{"name": "Соль"}')
+
+
+class KeysetPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        recipes = create_recipes(create_user('author'), 5)
+        # Три рецепта с одинаковой датой: порядок между ними задаёт id.
+        same = datetime(2026, 1, 2, tzinfo=timezone.utc)
+        Recipe.objects.filter(
+            id__in=[recipe.id for recipe in recipes[1:4]]
+        ).update(pub_date=same)
+        Recipe.objects.filter(id=recipes[0].id).update(
+            pub_date=datetime(2026, 1, 1, tzinfo=timezone.utc)
+        )
+        Recipe.objects.filter(id=recipes[4].id).update(
+            pub_date=datetime(2026, 1, 3, tzinfo=timezone.utc)
+        )
+        cls.expected = [recipes[4].id] + [
+            recipe.id for recipe in reversed(recipes[1:4])
+        ] + [recipes[0].id]
+
+    def walk(self, url):
+        ids = []
+        pages = 0
+        while url is not None:
+            response = APIClient().get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_pages_follow_ordering_with_ties(self):
+        for limit in (1, 2, 5):
+            with self.subTest(limit=limit):
+                ids, pages = self.walk(f'/api/recipes/?cursor=&limit={limit}')
+                self.assertEqual(ids, self.expected)
+                self.assertEqual(pages, -(-len(self.expected) // limit))
+
+    def test_last_page_has_no_next(self):
+        response = APIClient().get('/api/recipes/?cursor=&limit=10')
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_cursor_round_trip(self):
+        response = APIClient().get('/api/recipes/?cursor=&limit=2')
+        cursor = parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+        position = json.loads(urlsafe_b64decode(cursor.encode()))
+        second = Recipe.objects.get(id=self.expected[1])
+        self.assertEqual(position[1], second.id)
+        self.assertEqual(
+            datetime.fromisoformat(position[0]), second.pub_date
+        )
+        response = APIClient().get(f'/api/recipes/?cursor={cursor}&limit=2')
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            self.expected[2:4]
+        )
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-base64!', 'W10=', 'WzEsIDIsIDNd'):
+            with self.subTest(cursor=cursor):
+                response = APIClient().get(f'/api/recipes/?cursor={cursor}')
+                self.assertEqual(response.status_code, 404)
+
+
+class ZeroCountersTest(TestCase):
+    """Счётчики строк, созданных до их появления, равны нулю."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.user = create_user('user')
+        cls.recipe = create_recipes(cls.author, 1)[0]
+        FavoriteRecipe.objects.create(user=cls.user, recipe=cls.recipe)
+        Follow.objects.create(user=cls.user, following=cls.author)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_decrements_stop_at_zero(self):
+        user = self.client_for(self.user)
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.assertEqual(user.delete(f'{url}favorite/').status_code, 204)
+        self.assertEqual(
+            user.delete(f'/api/users/{self.author.id}/subscribe/').status_code,
+            204
+        )
+        self.assertEqual(
+            self.client_for(self.author).delete(url).status_code, 204
+        )
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+        self.assertEqual(self.author.recipes_count, 0)
+
+
+class SearchDocumentTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.recipes = create_recipes(cls.author, 3)
+        other = create_user('other')
+        for index in range(4):
+            Recipe.objects.create(
+                author=other, name=f'Рецепт другого {index}',
+                image='recipes/test.jpg', text='Текст', cooking_time=5
+            )
+        update_search_documents(Recipe.objects.all())
+
+    def document(self, recipe):
+        recipe.refresh_from_db()
+        return recipe.search_document.split('\n')
+
+    def test_written_for_ingredient_rows_and_renames(self):
+        recipe = self.recipes[0]
+        ingredient = Ingredient.objects.create(
+            name='Шафран', measurement_unit='г'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            # Так строки ингредиентов сохраняет инлайн в админке.
+            IngredientAmount.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1
+            )
+            recipe.name = 'Плов'
+            recipe.save()
+        self.assertEqual(self.document(recipe)[0], 'Плов')
+        self.assertIn('Шафран', self.document(recipe))
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.name = 'Куркума'
+            ingredient.save()
+        self.assertIn('Куркума', self.document(recipe))
+        self.assertNotIn('Шафран', self.document(recipe))
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientAmount.objects.filter(ingredient=ingredient).delete()
+        self.assertNotIn('Куркума', self.document(recipe))
+
+    def test_in_process_search_is_filtered_before_paginating(self):
+        response = APIClient().get(
+            f'/api/recipes/?search=рецепт&author={self.author.id}&limit=2'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class TagsModeTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # У двух рецептов оба тэга из create_recipes, у второго ещё один,
+        # у третьего — только первый.
+        cls.both, cls.three = create_recipes(create_user('author'), 2)
+        cls.only_first = Recipe.objects.create(
+            author=cls.both.author, name='Только первый тэг',
+            image='recipes/test.jpg', text='Текст', cooking_time=5
+        )
+        cls.only_first.tags.set([Tag.objects.get(slug='tag-0')])
+        extra = Tag.objects.create(
+            name='Тэг 2', color='#000002', slug='tag-2'
+        )
+        cls.three.tags.add(extra)
+
+    def get_ids(self, query):
+        response = APIClient().get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return sorted(recipe['id'] for recipe in response.data['results'])
+
+    def test_all_and_any(self):
+        tags = 'tags=tag-0&tags=tag-1'
+        self.assertEqual(
+            self.get_ids(f'{tags}&tags_mode=any'),
+            sorted([self.both.id, self.three.id, self.only_first.id])
+        )
+        self.assertEqual(self.get_ids(tags), self.get_ids(
+            f'{tags}&tags_mode=any'
+        ))
+        self.assertEqual(
+            self.get_ids(f'{tags}&tags_mode=all'),
+            sorted([self.both.id, self.three.id])
+        )
+        self.assertEqual(
+            self.get_ids('tags=tag-1&tags=tag-2&tags_mode=all'),
+            [self.three.id]
+        )
+
+
+@override_settings(FEED_FANOUT_ASYNC=False, IMAGE_PROCESSING_ASYNC=False)
+class FeedTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.follower = create_user('follower')
+        create_recipes(cls.author, 0)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.author)
+        self.follower_client = APIClient()
+        self.follower_client.force_authenticate(self.follower)
+
+    def subscribe(self):
+        response = self.follower_client.get(
+            f'/api/users/{self.author.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def post_recipe(self, name):
+        buffer = BytesIO()
+        Image.new('RGB', (8, 8), 'red').save(buffer, 'JPEG')
+        image = b64encode(buffer.getvalue()).decode()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author_client.post('/api/recipes/', {
+                'name': name,
+                'text': 'Текст',
+                'cooking_time': 10,
+                'image': f'data:image/jpeg;base64,{image}',
+                'tags': [Tag.objects.get(slug='tag-0').id],
+                'ingredients': [{
+                    'id': Ingredient.objects.get(name='Ингредиент 0').id,
+                    'amount': 1,
+                }],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def get_feed(self):
+        response = self.follower_client.get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def entries(self):
+        return list(FeedEntry.objects.filter(
+            user=self.follower
+        ).order_by('-pub_date').values_list('recipe_id', flat=True))
+
+    def test_new_recipe_is_fanned_out(self):
+        self.subscribe()
+        recipe_id = self.post_recipe('Борщ')
+        self.assertEqual(self.entries(), [recipe_id])
+        self.assertEqual(self.get_feed(), [recipe_id])
+
+    def test_unfollow_removes_entries(self):
+        self.subscribe()
+        self.post_recipe('Борщ')
+        response = self.follower_client.delete(
+            f'/api/users/{self.author.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.entries(), [])
+        self.assertEqual(self.get_feed(), [])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_popular_author_is_pulled_on_read(self):
+        self.subscribe()
+        first = self.post_recipe('Борщ')
+        self.assertEqual(self.entries(), [])
+        self.assertEqual(self.get_feed(), [first])
+        second = self.post_recipe('Щи')
+        self.assertEqual(self.entries(), [first])
+        self.assertEqual(self.get_feed(), [second, first])
+
+
+class SimilarRecipesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.recipes = create_recipes(cls.author, 3)
+
+    def update(self, *args):
+        call_command(
+            'update_similar', '--top-k', '2', *args, stdout=StringIO()
+        )
+        return {
+            recipe.id: dict(SimilarRecipe.objects.filter(
+                recipe=recipe
+            ).values_list('similar_id', 'score'))
+            for recipe in self.recipes
+        }
+
+    def test_incremental_update_rescores_changed_recipe(self):
+        source, changed, _ = self.recipes
+        self.assertAlmostEqual(self.update('--all')[source.id][changed.id], 1)
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.patch(f'/api/recipes/{changed.id}/', {
+            'ingredients': [{
+                'id': Ingredient.objects.get(name='Ингредиент 0').id,
+                'amount': 1,
+            }]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        incremental = self.update()
+        self.assertLess(incremental[source.id][changed.id], 0.99)
+        full = self.update('--all')
+        for recipe_id, scores in full.items():
+            self.assertEqual(incremental[recipe_id].keys(), scores.keys())
+            for similar_id, score in scores.items():
+                self.assertAlmostEqual(
+                    incremental[recipe_id][similar_id], score
+                )
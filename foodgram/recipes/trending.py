@@ -0,0 +1,89 @@
+from time import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Greatest, Power
+
+from .models import Recipe
+
+EPOCH_KEY = 'trending-epoch'
+
+
+def get_exponent(now=None):
+    """Число периодов полураспада от TRENDING_REFERENCE_TIME."""
+    return (
+        (time() if now is None else now) - settings.TRENDING_REFERENCE_TIME
+    ) / settings.TRENDING_HALF_LIFE
+
+
+def get_epoch(now=None):
+    """Номер эпохи — TRENDING_RESCALE_EXPONENT периодов полураспада."""
+    return max(
+        int(get_exponent(now) // settings.TRENDING_RESCALE_EXPONENT), 0
+    )
+
+
+def _decay(epoch):
+    """Множитель, переводящий счёт из эпохи рецепта в эпоху epoch.
+
+    Счёт, отставший больше чем на эпоху, переводится как отставший
+    на одну: он всё равно меньше TRENDING_MIN_SCORE, а на слишком малой
+    степени двойки PostgreSQL выдаёт ошибку потери значимости.
+    """
+    return Power(
+        Value(2.0),
+        Greatest(F('trending_epoch') - Value(epoch), Value(-1)) * Value(
+            float(settings.TRENDING_RESCALE_EXPONENT)
+        ),
+        output_field=FloatField()
+    )
+
+
+def add_trending(recipe_id, weight, now=None):
+    """Добавляет рецепту вес события с учётом времени.
+
+    Вместо того чтобы уменьшать счёт всех рецептов со временем, вес
+    нового события растёт: 2 ** ((t - TRENDING_REFERENCE_TIME) / период
+    полураспада). Счёт всех рецептов отсчитан от одного момента, поэтому
+    сортировка идёт по trending_score без пересчёта. Чтобы вес не
+    переполнил float, показатель отсчитывается от начала эпохи, а при
+    смене эпохи первое добавление переводит в неё счёт всех рецептов.
+    """
+    now = time() if now is None else now
+    epoch = get_epoch(now)
+    if cache.get(EPOCH_KEY, 0) < epoch:
+        renormalize_trending(now)
+    value = weight * 2 ** (
+        get_exponent(now) - epoch * settings.TRENDING_RESCALE_EXPONENT
+    )
+    return Recipe.objects.filter(pk=recipe_id).update(
+        trending_score=Case(
+            When(trending_epoch=epoch,
+                 then=F('trending_score') + Value(value)),
+            default=F('trending_score') * _decay(epoch) + Value(value),
+            output_field=FloatField()
+        ),
+        trending_epoch=epoch
+    )
+
+
+def renormalize_trending(now=None):
+    """Переводит счёт всех рецептов в текущую эпоху одним UPDATE.
+
+    Вызывается из add_trending при смене эпохи, раз в несколько лет;
+    слишком малый после перевода счёт обнуляется.
+    """
+    epoch = get_epoch(now)
+    stale = Recipe.objects.filter(trending_epoch__lt=epoch)
+    updated = stale.filter(trending_score__gt=0).update(
+        trending_score=F('trending_score') * _decay(epoch),
+        trending_epoch=epoch
+    )
+    stale.update(trending_epoch=epoch)
+    Recipe.objects.filter(
+        trending_score__gt=0,
+        trending_score__lt=settings.TRENDING_MIN_SCORE
+    ).update(trending_score=0)
+    cache.set(EPOCH_KEY, epoch, None)
+    return updated
@@ -0,0 +1,53 @@
+import os
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework.exceptions import ValidationError
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+IMAGE_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+
+
+def sniff_image_type(head):
+    for signature, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+class RecipeImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загружаемый файл сразу во временный файл на диске.
+
+    Тип файла определяется по первым байтам, а не по заголовку клиента;
+    загрузка прерывается, как только превышен RECIPE_IMAGE_MAX_SIZE.
+    """
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0:
+            content_type = sniff_image_type(raw_data)
+            if content_type is None:
+                raise ValidationError({
+                    self.field_name:
+                        'Допустимы только изображения JPEG, PNG, GIF и WebP'
+                })
+            self.file.content_type = content_type
+            name = os.path.splitext(self.file_name)[0]
+            self.file.name = f'{name}.{IMAGE_EXTENSIONS[content_type]}'
+        if start + len(raw_data) > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise ValidationError({
+                self.field_name: 'Размер файла не должен превышать '
+                f'{settings.RECIPE_IMAGE_MAX_SIZE // (1024 * 1024)} МБ'
+            })
+        return super().receive_data_chunk(raw_data, start)
@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from foodgram.async_views import async_read_view
 from .views import (DownloadShop, RecipeViewSet, IngredientViewSet, TagViewSet)
 
 router = DefaultRouter()
@@ -10,5 +11,19 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 
 urlpatterns = [
     path('recipes/download_shopping_cart/', DownloadShop.as_view()),
+    path('recipes/', async_read_view(
+        RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+    )),
+    path('recipes/<int:pk>/', async_read_view(
+        RecipeViewSet.as_view({
+            'get': 'retrieve',
+            'put': 'update',
+            'patch': 'partial_update',
+            'delete': 'destroy',
+        })
+    )),
+    path('ingredients/', async_read_view(
+        IngredientViewSet.as_view({'get': 'list'})
+    )),
     path('', include(router.urls)),
 ]
@@ -1,35 +1,78 @@
-from io import StringIO
-from django.http import HttpResponse
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from foodgram.pagination import LimitPageNumberPaginator
-from .filters import IngredientFilter, RecipeFilter
+from foodgram.negotiation import IgnoreClientContentNegotiation
+from foodgram.pagination import KeysetPaginator, LimitPageNumberPaginator
+from foodgram.user_flags import (
+    FAVORITE, FOLLOW, SHOPPING_CART, PrefetchUserFlagsMixin,
+    invalidate_user_flags
+)
+from .autocomplete import get_ingredient_index
+from .cache import ReferenceCacheMixin
+from .coverage import get_coverage_index
+from .feed import FeedPaginator, pull_popular_authors
+from .exporters import EXPORTERS, spool
+from .filters import (
+    ORDERINGS, SEARCH_ORDERING, IngredientFilter, RecipeFilter
+)
 from .models import (
-    Ingredient,
-    Recipe, Tag
+    Ingredient, IngredientAmount,
+    FeedEntry, Recipe, ShoppingListItem, Tag
 )
 from .permissions import IsAdminOrReadOnly, IsAuthorOrAdmin
 from .serializers import (
     IngredientSerializer, RecipeSerializer,
     RecipeFullSerializer, TagSerializer
 )
-from .services import get_header_message, get_total_list
+from .services import (
+    CHUNK_SIZE, apply_shopping_list_deltas, get_cart_users,
+    get_header_message, get_recipe_amounts, get_total_list, lock_recipe
+)
+from .trending import add_trending
+from .uploads import RecipeImageUploadHandler
+
+User = get_user_model()
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list' and self.request.query_params.get('name'):
+            return queryset[:settings.INGREDIENT_SEARCH_LIMIT]
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if (not request.query_params.get('name')
+                or not settings.INGREDIENT_AUTOCOMPLETE_CACHE):
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(self.autocomplete, request)
+
+    def autocomplete(self, request):
+        ingredients = get_ingredient_index().search(
+            request.query_params['name'], settings.INGREDIENT_SEARCH_LIMIT
+        )
+        return Response(self.get_serializer(ingredients, many=True).data)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(PrefetchUserFlagsMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_classes = {
         'retrieve': RecipeSerializer,
@@ -39,20 +82,80 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthorOrAdmin,)
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
-    pagination_class = LimitPageNumberPaginator
+    pagination_class = KeysetPaginator
+    parser_classes = (JSONParser, MultiPartParser)
+    user_flags = (FAVORITE, SHOPPING_CART, FOLLOW)
+
+    @property
+    def keyset_ordering(self):
+        ordering = self.request.query_params.get('ordering')
+        if ordering == 'trending':
+            # Счёт меняется с каждым добавлением,
+            # курсор по нему пропускал бы и повторял рецепты.
+            return None
+        if ordering in ORDERINGS:
+            return ORDERINGS[ordering]
+        if self.request.query_params.get('search', '').strip():
+            return SEARCH_ORDERING
+        return ('-pub_date', '-id')
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [RecipeImageUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
 
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action,
                                            self.default_serializer_class)
 
-    def _favorite_shopping_post_delete(self, related_manager):
+    def get_queryset(self):
+        return Recipe.objects.select_related('author').prefetch_related(
+            Prefetch(
+                'recipe_ingredient',
+                queryset=IngredientAmount.objects.select_related('ingredient')
+            ),
+            'tags',
+        )
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            lock_recipe(instance.pk)
+            apply_shopping_list_deltas(
+                get_cart_users(instance.pk),
+                get_recipe_amounts(instance.pk, sign=-1)
+            )
+            instance.delete()
+            User.objects.filter(
+                pk=instance.author_id, recipes_count__gt=0
+            ).update(recipes_count=F('recipes_count') - 1)
+
+    def _favorite_shopping_post_delete(self, related_manager, flag,
+                                       counter=None, on_change=None):
         recipe = self.get_object()
         if self.request.method == 'DELETE':
-            related_manager.get(recipe_id=recipe.id).delete()
+            with transaction.atomic():
+                related_manager.get(recipe_id=recipe.id).delete()
+                if counter:
+                    # Счётчик строк, созданных до его появления или через
+                    # админку, может быть нулём до запуска recount.
+                    Recipe.objects.filter(
+                        pk=recipe.pk, **{f'{counter}__gt': 0}
+                    ).update(**{counter: F(counter) - 1})
+                if on_change:
+                    on_change(recipe, -1)
+                invalidate_user_flags(self.request.user.id, flag)
             return Response(status=status.HTTP_204_NO_CONTENT)
         if related_manager.filter(recipe=recipe).exists():
             raise ValidationError('Рецепт уже в избранном')
-        related_manager.create(recipe=recipe)
+        with transaction.atomic():
+            related_manager.create(recipe=recipe)
+            if counter:
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    **{counter: F(counter) + 1}
+                )
+            if on_change:
+                on_change(recipe, 1)
+            add_trending(recipe.pk, settings.TRENDING_WEIGHTS[flag])
+            invalidate_user_flags(self.request.user.id, flag)
         serializer = RecipeSerializer(instance=recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -61,7 +164,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             methods=['POST', 'DELETE'], )
     def favorite(self, request, pk=None):
         return self._favorite_shopping_post_delete(
-            request.user.favorite
+            request.user.favorite, FAVORITE, 'favorites_count'
         )
 
     @action(detail=True,
@@ -69,11 +172,114 @@ class RecipeViewSet(viewsets.ModelViewSet):
             methods=['POST', 'DELETE'], )
     def shopping_cart(self, request, pk=None):
         return self._favorite_shopping_post_delete(
-            request.user.shopping_user
+            request.user.shopping_user, SHOPPING_CART,
+            on_change=self._update_shopping_list
         )
 
+    def _update_shopping_list(self, recipe, sign):
+        lock_recipe(recipe.pk)
+        apply_shopping_list_deltas(
+            [self.request.user.id], get_recipe_amounts(recipe.pk, sign)
+        )
+
+    @action(detail=False,
+            permission_classes=[permissions.IsAuthenticated])
+    def shopping_cart_totals(self, request):
+        """Итоги списка покупок без выгрузки и очистки корзины."""
+        return Response([
+            {
+                'name': row['ingredient__name'],
+                'measurement_unit': row['ingredient__measurement_unit'],
+                'amount': row['total'],
+            }
+            for row in get_total_list(request.user)
+        ])
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=False,
+            permission_classes=[permissions.IsAuthenticated])
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые первыми."""
+        paginator = FeedPaginator()
+        if not request.query_params.get(paginator.cursor_query_param):
+            pull_popular_authors(request.user.id)
+        entries = paginator.paginate_queryset(
+            FeedEntry.objects.filter(user=request.user).select_related(
+                'recipe__author'
+            ).prefetch_related(
+                Prefetch(
+                    'recipe__recipe_ingredient',
+                    queryset=IngredientAmount.objects.select_related(
+                        'ingredient'
+                    )
+                ),
+                'recipe__tags',
+            ),
+            request
+        )
+        serializer = RecipeSerializer(
+            [entry.recipe for entry in entries],
+            many=True,
+            context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """Похожие рецепты из списка, посчитанного update_similar."""
+        get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        recipes = self.get_queryset().filter(
+            similar_to__recipe_id=pk
+        ).annotate(
+            similarity=F('similar_to__score')
+        ).order_by('-similarity')
+        data = RecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        ).data
+        for item, recipe in zip(data, recipes):
+            item['similarity'] = round(recipe.similarity, 3)
+        return Response(data)
+
+    @action(detail=False)
+    def what_to_cook(self, request):
+        """Рецепты по имеющимся ингредиентам, лучшие совпадения первыми."""
+        try:
+            ingredient_ids = {
+                int(value)
+                for value in request.query_params.getlist('ingredients')
+            }
+            min_coverage = float(request.query_params.get('min_coverage', 0))
+        except ValueError:
+            raise ValidationError(
+                'ingredients — id ингредиентов, min_coverage — число от 0 до 1'
+            )
+        # Сравнение с NaN всегда ложно, так что NaN тоже отклоняется.
+        if not 0 <= min_coverage <= 1:
+            raise ValidationError(
+                {'min_coverage': 'min_coverage — число от 0 до 1'}
+            )
+        if not ingredient_ids:
+            raise ValidationError(
+                {'ingredients': 'Укажите хотя бы один ингредиент'}
+            )
+        matches = get_coverage_index().search(ingredient_ids, min_coverage)
+        paginator = LimitPageNumberPaginator()
+        page = paginator.paginate_queryset(matches, request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        page = [match for match in page if match[0] in recipes]
+        data = RecipeSerializer(
+            [recipes[recipe_id] for recipe_id, _, _ in page],
+            many=True,
+            context=self.get_serializer_context()
+        ).data
+        for item, (_, coverage, missing) in zip(data, page):
+            item['coverage'] = round(coverage, 3)
+            item['missing'] = missing
+        return paginator.get_paginated_response(data)
+
+
+class TagViewSet(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
     queryset = Tag.objects.all()
@@ -81,21 +287,38 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 class DownloadShop(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+    content_negotiation_class = IgnoreClientContentNegotiation
+
     def get(self, request):
+        export_format = request.query_params.get('format', 'txt')
+        if export_format not in EXPORTERS:
+            raise ValidationError(
+                {'format': f'Доступные форматы: {", ".join(EXPORTERS)}'}
+            )
+        exporter, content_type, filename = EXPORTERS[export_format]
         user = request.user
         queryset = user.shopping_user.select_related('recipe').all()
         message = get_header_message(queryset)
-        total_list = get_total_list(queryset)
-
-        f = StringIO()
-        f.name = 'shopping-list.txt'
-        f.write(f'{message}\n\n')
-        for k, v in total_list.items():
-            for unit, amount in v.items():
-                f.write(f'{k}: {amount} {unit}\n')
-
-        response = HttpResponse(f.getvalue(), content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={f.name}'
-        user.shopping_user.all().delete()
+        total_list = get_total_list(user).iterator(chunk_size=CHUNK_SIZE)
 
+        content = self._clear_after(exporter(message, total_list), user)
+        if isinstance(request._request, ASGIRequest):
+            # Под ASGI Django 3.2 читает потоковый ответ в цикле событий,
+            # где запросы к БД запрещены: выгрузка пишется во временный
+            # файл здесь, а в цикле событий читается только файл.
+            response = FileResponse(spool(content), content_type=content_type)
+        else:
+            response = StreamingHttpResponse(
+                content, content_type=content_type
+            )
+        response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
+
+    @staticmethod
+    def _clear_after(content, user):
+        yield from content
+        with transaction.atomic():
+            user.shopping_user.all().delete()
+            ShoppingListItem.objects.filter(user=user).delete()
+        invalidate_user_flags(user.id, SHOPPING_CART)
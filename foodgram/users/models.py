@@ -18,6 +18,16 @@ class CustomUser(AbstractUser):
         choices=ROLES,
         default=USER,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -2,10 +2,21 @@ from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from foodgram.user_flags import FOLLOW, get_user_flags
 from .models import Follow
 
 User = get_user_model()
 
+RECIPES_LIMIT = 3
+
+
+def get_recipes_limit(request):
+    try:
+        limit = int(request.query_params.get('recipes_limit', RECIPES_LIMIT))
+    except (AttributeError, ValueError):
+        return RECIPES_LIMIT
+    return limit if limit > 0 else RECIPES_LIMIT
+
 
 class UserFollowSerializer(serializers.ModelSerializer):
     user = serializers.SlugRelatedField(
@@ -55,21 +66,17 @@ class FollowSerializer(serializers.ModelSerializer):
             'is_signed', 'recipes', 'recipes_count'
         )
 
-    def get_is_signed(self, user):
-        current_user = self.context.get('current_user')
-        other_user = user.following.all()
-        if user.is_anonymous:
-            return False
-        if other_user.count() == 0:
-            return False
-        return (
-            Follow.objects.filter(user=user, following=current_user).exists()
-        )
+    def get_is_signed(self, obj):
+        request = self.context.get('request')
+        return obj.id in get_user_flags(request, FOLLOW)
 
     def get_recipes(self, obj):
         from recipes.serializers import RecipeImageSerializer
-        recipes = obj.recipes.all()[:3]
         request = self.context.get('request')
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
+        else:
+            recipes = obj.recipes.all()[:get_recipes_limit(request)]
         return RecipeImageSerializer(
             recipes,
             many=True,
@@ -77,7 +84,7 @@ class FollowSerializer(serializers.ModelSerializer):
         ).data
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
 
 class CurrentUserSerializer(serializers.ModelSerializer):
@@ -93,7 +100,4 @@ class CurrentUserSerializer(serializers.ModelSerializer):
 
     def get_is_signed(self, obj):
         request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        user = request.user
-        return Follow.objects.filter(following=obj, user=user).exists()
+        return obj.id in get_user_flags(request, FOLLOW)
@@ -1,10 +1,13 @@
 from django.urls import include, path
 
+from foodgram.async_views import async_read_view
 from .views import FollowApiView, FollowListApiView
 
 
 urlpatterns = [
-    path('users/subscriptions/', FollowListApiView.as_view()),
+    path(
+        'users/subscriptions/', async_read_view(FollowListApiView.as_view())
+    ),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
     path('users/<int:following_id>/subscribe/', FollowApiView.as_view()),
@@ -1,4 +1,6 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Prefetch, prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from rest_framework import status, viewsets, generics
 from rest_framework.decorators import action
@@ -8,9 +10,17 @@ from rest_framework.permissions import (
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from foodgram.pagination import KeysetPaginator
+from foodgram.user_flags import (
+    FOLLOW, PrefetchUserFlagsMixin, invalidate_user_flags
+)
+from recipes.feed import backfill_feed
+from recipes.models import FeedEntry
+from recipes.services import get_latest_recipes
 from .models import CustomUser, Follow
 from .serializers import (
-    FollowSerializer, UserFollowSerializer, CurrentUserSerializer
+    FollowSerializer, UserFollowSerializer, CurrentUserSerializer,
+    get_recipes_limit
 )
 
 User = get_user_model()
@@ -43,19 +53,39 @@ class FollowApiView(APIView):
         serializer = UserFollowSerializer(data=data,
                                           context={'request': request})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
+            CustomUser.objects.filter(id=following_id).update(
+                followers_count=F('followers_count') + 1
+            )
+            backfill_feed(user.id, [following_id])
+            invalidate_user_flags(user.id, FOLLOW)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, following_id):
         user = request.user
         following = get_object_or_404(CustomUser, id=following_id)
-        Follow.objects.filter(user=user, following=following).delete()
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(
+                user=user, following=following
+            ).delete()
+            if deleted:
+                CustomUser.objects.filter(
+                    id=following_id, followers_count__gt=0
+                ).update(followers_count=F('followers_count') - 1)
+                FeedEntry.objects.filter(
+                    user=user, author=following
+                ).delete()
+                invalidate_user_flags(user.id, FOLLOW)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class FollowListApiView(generics.ListAPIView):
+class FollowListApiView(PrefetchUserFlagsMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated, ]
     serializer_class = FollowSerializer
+    pagination_class = KeysetPaginator
+    keyset_ordering = ('id',)
+    user_flags = (FOLLOW,)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -65,3 +95,15 @@ class FollowListApiView(generics.ListAPIView):
     def get_queryset(self):
         user = self.request.user
         return CustomUser.objects.filter(following__user=user)
+
+    def paginate_queryset(self, queryset):
+        authors = super().paginate_queryset(queryset)
+        prefetch_related_objects(authors, Prefetch(
+            'recipes',
+            queryset=get_latest_recipes(
+                [author.id for author in authors],
+                get_recipes_limit(self.request)
+            ),
+            to_attr='latest_recipes'
+        ))
+        return authors